@@ -0,0 +1,253 @@
+"""Analítica de ventas por producto, hora, mesa y día de la semana.
+
+Los pagos del rango y sus líneas se leen de una vez como columnas NumPy
+(una consulta para pagos y otra para líneas, sin objetos ORM ni ``Row``) y los
+agregados se calculan con ``np.bincount`` sobre índices enteros, sin
+recorrer filas en Python. Sin ``desde`` el rango son los últimos
+``ANALYTICS_DIAS`` días: el histórico completo se pide explícitamente.
+
+Los resultados se guardan en un caché LRU por rango. Cada entrada recuerda
+el ``MAX(pagos.id)`` con el que se calculó: un pago nuevo (en cualquier
+worker) cambia ese máximo y la entrada se recalcula en la siguiente
+consulta.
+"""
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import BigInteger, Integer, cast, extract, func, select
+from sqlalchemy.orm import Session
+
+from models import Mesa, Orden, OrdenDetalle, Pago, Producto
+
+# Productos por hora en "top productos"
+ANALYTICS_TOP = int(os.getenv("ANALYTICS_TOP", "5"))
+# Rangos distintos que se recuerdan
+ANALYTICS_CACHE = int(os.getenv("ANALYTICS_CACHE", "32"))
+# Días que cubre la analítica cuando no se indica ``desde``
+ANALYTICS_DIAS = int(os.getenv("ANALYTICS_DIAS", "30"))
+
+HORAS = 24
+DIAS_SEMANA = 7
+
+
+class Columnas:
+    """Pagos y líneas del rango como arreglos paralelos.
+
+    ``linea_pago`` es la posición (en los arreglos ``pago_*``) del pago de
+    cada línea, así los agregados por línea leen la hora de su pago sin join.
+    """
+
+    __slots__ = (
+        "pago_monto", "pago_hora", "pago_dia_semana", "pago_mesa",
+        "linea_pago", "linea_producto", "linea_cantidad", "linea_precio",
+        "producto_id", "producto_nombre",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.__slots__:
+            setattr(self, name, arrays[name])
+
+
+# Un campo por columna seleccionada, cada uno con su tipo
+_PAGOS = np.dtype([("orden", np.int64), ("mesa", np.int64), ("horas", np.int64), ("monto", np.float64)])
+_LINEAS = np.dtype([("orden", np.int64), ("producto", np.int64), ("cantidad", np.int64), ("precio", np.float64)])
+
+
+def desde_por_defecto(hasta: datetime.datetime | None = None) -> str:
+    """``desde`` cuando no se indica: ``ANALYTICS_DIAS`` días antes de ``hasta`` (o de hoy, en UTC como Pago.fecha).
+
+    Es una fecha sin hora, así la clave de caché del rango por defecto solo cambia una vez al día.
+    """
+    fin = hasta or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (fin.date() - datetime.timedelta(days=ANALYTICS_DIAS)).isoformat()
+
+
+def _horas_epoch(sqlite: bool):
+    # Horas desde 1970-01-01 (UTC, como se guarda Pago.fecha); hora del día y día de la semana salen en NumPy.
+    # strftime('%s') existe en cualquier SQLite (unixepoch() requiere 3.38)
+    if sqlite:
+        return cast(func.strftime("%s", Pago.fecha), Integer) // 3600
+    return cast(extract("epoch", Pago.fecha), BigInteger) // 3600
+
+
+def _columnas(result, dtype: np.dtype) -> np.ndarray:
+    """Resultado -> arreglo estructurado con un campo por columna.
+
+    Se itera el cursor DBAPI (sin construir ``Row``) y ``np.fromiter`` copia
+    cada tupla directo a su registro, sin listas intermedias.
+    """
+    try:
+        return np.fromiter(result.cursor, dtype=dtype)
+    finally:
+        result.close()
+
+
+def cargar(db: Session, condiciones: list) -> Columnas:
+    sqlite = db.get_bind().dialect.name == "sqlite"
+    conn = db.connection()
+
+    pagos = _columnas(
+        conn.execute(
+            select(Pago.orden_id, Orden.mesa_id, _horas_epoch(sqlite), Pago.monto_total)
+            .join(Orden, Orden.id == Pago.orden_id)
+            .where(*condiciones)
+        ),
+        _PAGOS,
+    )
+    pago_orden, pago_mesa_id, horas = pagos["orden"], pagos["mesa"], pagos["horas"]
+
+    mesas = conn.execute(select(Mesa.id, Mesa.numero).order_by(Mesa.id)).all()
+    mesa_ids = np.array([m[0] for m in mesas], dtype=np.int64)
+    mesa_numeros = np.array([m[1] for m in mesas], dtype=np.int64)
+    pago_mesa = mesa_numeros[np.searchsorted(mesa_ids, pago_mesa_id)] if len(mesas) else pago_mesa_id
+
+    linea_pago = linea_producto = linea_cantidad = np.zeros(0, dtype=np.int64)
+    linea_precio = np.zeros(0, dtype=np.float64)
+    if len(pago_orden):
+        # Sin join con pagos (una búsqueda por línea): se leen las líneas del intervalo de órdenes y se filtran
+        # aquí. "+ 0" evita que SQLite recorra el índice (orden_id, producto_id) fila por fila cuando el intervalo
+        # cubre casi toda la tabla.
+        # Precio guardado en la línea (el cobrado), sin join con productos
+        lineas = _columnas(
+            conn.execute(
+                select(
+                    OrdenDetalle.orden_id,
+                    OrdenDetalle.producto_id,
+                    OrdenDetalle.cantidad,
+                    func.coalesce(OrdenDetalle.precio_unitario, 0.0),
+                ).where((OrdenDetalle.orden_id + 0).between(int(pago_orden.min()), int(pago_orden.max())))
+            ),
+            _LINEAS,
+        )
+        linea_orden = lineas["orden"]
+        por_orden = np.argsort(pago_orden, kind="stable")
+        pos = np.minimum(np.searchsorted(pago_orden, linea_orden, sorter=por_orden), len(pago_orden) - 1)
+        linea_pago = por_orden[pos]
+        pagada = pago_orden[linea_pago] == linea_orden
+        linea_pago = linea_pago[pagada]
+        linea_producto = lineas["producto"][pagada]
+        linea_cantidad = lineas["cantidad"][pagada]
+        linea_precio = lineas["precio"][pagada]
+
+    # Solo para nombres del top de productos
+    productos = conn.execute(select(Producto.id, Producto.nombre).order_by(Producto.id)).all()
+    return Columnas(
+        pago_monto=pagos["monto"],
+        pago_hora=horas % HORAS,
+        # 1970-01-01 fue jueves; 0 = domingo ... 6 = sábado, igual que /api/finanzas/resumen
+        pago_dia_semana=(horas // HORAS + 4) % DIAS_SEMANA,
+        pago_mesa=pago_mesa,
+        linea_pago=linea_pago,
+        linea_producto=linea_producto,
+        linea_cantidad=linea_cantidad,
+        linea_precio=linea_precio,
+        producto_id=np.array([p[0] for p in productos], dtype=np.int64),
+        producto_nombre=[p[1] for p in productos],
+    )
+
+
+def calcular(cols: Columnas, top: int = ANALYTICS_TOP) -> dict:
+    """Agregados del rango; todo son operaciones sobre arreglos completos."""
+    n_pagos = len(cols.pago_monto)
+    n_productos = len(cols.producto_id)
+
+    linea_hora = cols.pago_hora[cols.linea_pago]
+    producto = np.minimum(np.searchsorted(cols.producto_id, cols.linea_producto), max(n_productos - 1, 0))
+    # Líneas de productos que ya no existen no suman (peso 0)
+    conocido = cols.producto_id[producto] == cols.linea_producto if n_productos else np.zeros(len(producto), bool)
+    linea_cantidad = np.where(conocido, cols.linea_cantidad, 0)
+    linea_total = linea_cantidad * cols.linea_precio
+
+    celda = linea_hora * n_productos + producto
+    unidades = np.bincount(celda, weights=linea_cantidad, minlength=HORAS * n_productos).reshape(HORAS, n_productos)
+    ventas = np.bincount(celda, weights=linea_total, minlength=HORAS * n_productos).reshape(HORAS, n_productos)
+    ranking = np.argsort(-ventas, axis=1, kind="stable")[:, :top]
+
+    hora_total = np.bincount(cols.pago_hora, weights=cols.pago_monto, minlength=HORAS)
+    hora_pagos = np.bincount(cols.pago_hora, minlength=HORAS)
+
+    mesas, mesa_idx = np.unique(cols.pago_mesa, return_inverse=True)
+    mesa_total = np.bincount(mesa_idx, weights=cols.pago_monto, minlength=len(mesas))
+    mesa_pagos = np.bincount(mesa_idx, minlength=len(mesas))
+
+    dia_total = np.bincount(cols.pago_dia_semana, weights=cols.pago_monto, minlength=DIAS_SEMANA)
+    dia_pagos = np.bincount(cols.pago_dia_semana, minlength=DIAS_SEMANA)
+
+    def ticket(total: float, pagos: int) -> float:
+        return round(total / pagos, 2) if pagos else 0.0
+
+    return {
+        "pagos": n_pagos,
+        "lineas": len(cols.linea_pago),
+        "total": round(float(cols.pago_monto.sum()), 2),
+        "por_hora": [
+            {
+                "hora": h,
+                "total": round(float(hora_total[h]), 2),
+                "pagos": int(hora_pagos[h]),
+                "top": [
+                    {
+                        "producto_id": int(cols.producto_id[p]),
+                        "nombre": cols.producto_nombre[p],
+                        "cantidad": int(unidades[h, p]),
+                        "total": round(float(ventas[h, p]), 2),
+                    }
+                    for p in ranking[h]
+                    if unidades[h, p] > 0
+                ],
+            }
+            for h in range(HORAS)
+            if hora_pagos[h]
+        ],
+        "por_mesa": [
+            {
+                "mesa_numero": int(m),
+                "total": round(float(mesa_total[i]), 2),
+                "pagos": int(mesa_pagos[i]),
+                "ticket_promedio": ticket(float(mesa_total[i]), int(mesa_pagos[i])),
+            }
+            for i, m in enumerate(mesas)
+        ],
+        "por_dia_semana": [
+            {
+                "dia_semana": d,
+                "total": round(float(dia_total[d]), 2),
+                "pagos": int(dia_pagos[d]),
+                "ticket_promedio": ticket(float(dia_total[d]), int(dia_pagos[d])),
+            }
+            for d in range(DIAS_SEMANA)
+        ],
+    }
+
+
+class AnalyticsCache:
+    def __init__(self, size: int = ANALYTICS_CACHE):
+        self._size = size
+        self._entries: OrderedDict[tuple, tuple[int, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, key: tuple, condiciones: list, top: int = ANALYTICS_TOP) -> dict:
+        # MAX(id) sale del índice de la clave primaria: no recorre pagos
+        marca = db.execute(select(func.coalesce(func.max(Pago.id), 0))).scalar_one()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == marca:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        result = calcular(cargar(db, condiciones), top)
+        with self._lock:
+            self._entries[key] = (marca, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return result
+
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,102 @@
+"""Tiempo de ``/api/finanzas/analitica`` con ~1M líneas de orden.
+
+Siembra ``--pagos`` pagos (2 líneas por orden) en una BD temporal y mide por
+separado la lectura columnar (``cargar``), los agregados NumPy
+(``calcular``), el cálculo sin caché y con caché, para todo el histórico, para
+el rango por defecto del endpoint (``ANALYTICS_DIAS``) y para los rangos de
+``bench_resumen``. Como referencia calcula lo mismo
+recorriendo las filas en Python con diccionarios.
+
+Uso (desde backend/):
+    python bench/bench_analytics.py [--pagos 500000] [--runs 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from analytics import AnalyticsCache, calcular, cargar, desde_por_defecto  # noqa: E402
+from bench_export import _seed_lineas  # noqa: E402
+from bench_resumen import RANGOS, _seed  # noqa: E402
+from database import create_db_engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Mesa, Orden, OrdenDetalle, Pago  # noqa: E402
+from routes.finanzas import filtro_fechas, parse_fecha  # noqa: E402
+
+
+def _python(db: Session) -> tuple:
+    # Referencia: join por línea y agregados fila por fila en diccionarios
+    pagos = {}
+    por_mesa = defaultdict(float)
+    por_dia = defaultdict(float)
+    for orden_id, fecha, mesa, monto in db.execute(
+        select(Pago.orden_id, Pago.fecha, Mesa.numero, Pago.monto_total)
+        .join(Orden, Orden.id == Pago.orden_id).join(Mesa, Mesa.id == Orden.mesa_id)
+    ):
+        pagos[orden_id] = fecha.hour
+        por_mesa[mesa] += monto
+        por_dia[fecha.isoweekday() % 7] += monto
+    por_hora = defaultdict(float)
+    for orden_id, producto_id, cantidad, precio in db.execute(
+        select(OrdenDetalle.orden_id, OrdenDetalle.producto_id, OrdenDetalle.cantidad, OrdenDetalle.precio_unitario)
+        .join(Pago, Pago.orden_id == OrdenDetalle.orden_id)
+    ):
+        por_hora[(pagos[orden_id], producto_id)] += cantidad * precio
+    return por_hora, por_mesa, por_dia
+
+
+def _ms(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pagos", type=int, default=500_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        run_migrations(engine)
+        _seed(engine, args.pagos)
+        _seed_lineas(engine)
+        print(f"{args.pagos} pagos, {2 * args.pagos} líneas")
+        with Session(engine) as db:
+            cols = cargar(db, [])
+            cache = AnalyticsCache()
+            casos = [
+                ("cargar (columnas)", lambda: cargar(db, [])),
+                ("calcular (numpy)", lambda: calcular(cols)),
+                ("histórico sin caché", lambda: calcular(cargar(db, []))),
+                ("histórico con caché", lambda: cache.get(db, (None, None, 5), [])),
+                ("python (filas)", lambda: _python(db)),
+            ]
+            # Sin "desde", como el endpoint, tomando el final de los datos sembrados como hoy
+            fin = RANGOS["año"][1]
+            inicio = desde_por_defecto(parse_fecha(fin, "hasta"))
+            casos.append(("por defecto: sin caché", lambda: calcular(cargar(db, filtro_fechas(inicio, fin)))))
+            for nombre, (desde, hasta) in RANGOS.items():
+                casos.append((f"{nombre}: sin caché", lambda d=desde, h=hasta: calcular(cargar(db, filtro_fechas(d, h)))))
+            print(f"{'caso':<22}{'ms':>10}")
+            for etiqueta, fn in casos:
+                print(f"{etiqueta:<22}{_ms(fn, args.runs):>10.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
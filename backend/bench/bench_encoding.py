@@ -0,0 +1,91 @@
+"""Compara JSON y MessagePack (campos etiquetados) para los mensajes de /ws/ordenes.
+
+Arma un tablero sintético y mide, para un snapshot, un ``update_order``
+completo y un ``order_delta``: bytes por mensaje y tiempo de codificación
+y decodificación. "msgpack" incluye el etiquetado/desetiquetado de campos
+(``wire.tag``/``wire.untag``); "msgpack sin untag" es lo que paga un
+cliente que lee las etiquetas enteras directamente.
+
+Uso (desde backend/):
+    python bench/bench_encoding.py [--orders 40] [--items 12] [--runs 2000]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import msgpack  # noqa: E402
+
+from wire import decode_msgpack, encode_json, encode_msgpack  # noqa: E402
+
+
+def _order(i: int, items: int) -> dict:
+    return {
+        "id": 1000 + i,
+        "mesa_numero": 1 + i % 30,
+        "fecha": (datetime.datetime(2026, 1, 1, 12) + datetime.timedelta(minutes=i)).isoformat(),
+        "estado": "en_proceso",
+        "items": [
+            {
+                "producto_id": p,
+                "nombre": f"Producto de la carta número {p}",
+                "precio": round(4.5 + p * 0.75, 2),
+                "cantidad": 1 + p % 3,
+                "entregado": False,
+                "entregados": p % 2,
+            }
+            for p in range(1, items + 1)
+        ],
+        "pagado": False,
+        "version": 3,
+    }
+
+
+def _messages(n_orders: int, n_items: int) -> dict[str, dict]:
+    orders = [_order(i, n_items) for i in range(n_orders)]
+    return {
+        "snapshot": {"type": "snapshot", "seq": 5120, "epoch": "a1b2c3d4e5f6", "orders": orders},
+        "update_order": {"type": "update_order", "order": orders[0], "seq": 5121},
+        "order_delta": {
+            "type": "order_delta", "id": 1000, "mesa_numero": 1, "version": 4, "base": 3,
+            "items": [{"producto_id": 3, "cantidad": 1, "entregado": True, "entregados": 1}], "seq": 5122,
+        },
+    }
+
+
+def _us(fn, runs: int) -> float:
+    return min(timeit.repeat(fn, number=runs, repeat=3)) / runs * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=40)
+    parser.add_argument("--items", type=int, default=12)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'mensaje':<14}{'codificación':<20}{'bytes':>9}{'codif. us':>12}{'decodif. us':>13}")
+    for name, msg in _messages(args.orders, args.items).items():
+        runs = max(10, args.runs // 50) if name == "snapshot" else args.runs
+        as_json = encode_json(msg).encode("utf-8")
+        as_msgpack = encode_msgpack(msg)
+        rows = [
+            ("json", len(as_json), _us(lambda: encode_json(msg), runs), _us(lambda: json.loads(as_json), runs)),
+            ("msgpack", len(as_msgpack), _us(lambda: encode_msgpack(msg), runs), _us(lambda: decode_msgpack(as_msgpack), runs)),
+            (
+                "msgpack sin untag",
+                len(as_msgpack),
+                _us(lambda: encode_msgpack(msg), runs),
+                _us(lambda: msgpack.unpackb(as_msgpack, raw=False, strict_map_key=False), runs),
+            ),
+        ]
+        for label, size, enc, dec in rows:
+            print(f"{name:<14}{label:<20}{size:>9}{enc:>12.1f}{dec:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
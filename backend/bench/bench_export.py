@@ -0,0 +1,99 @@
+"""Memoria y tiempo al primer byte de ``/api/finanzas/export``.
+
+Siembra ``--pagos`` pagos (con 2 líneas por orden) en una BD temporal y
+recorre el generador del export en cada formato, midiendo cuánto tarda el
+primer bloque, el total y el tamaño generado; en una segunda pasada, con
+``tracemalloc``, el pico de memoria Python. Como referencia mide materializar
+los mismos pagos como objetos ORM, que es lo que hace un listado sin paginar.
+
+Uso (desde backend/):
+    python bench/bench_export.py [--pagos 1000000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+from bench_resumen import _seed  # noqa: E402
+from database import create_db_engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Pago  # noqa: E402
+from routes.finanzas import export_select, exportar  # noqa: E402
+
+
+def _seed_lineas(engine) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO orden_detalle (orden_id, producto_id, cantidad, entregado, entregados) "
+            "SELECT id, 1 + id % 5, 1 + id % 3, 1, 1 + id % 3 FROM ordenes"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO orden_detalle (orden_id, producto_id, cantidad, entregado, entregados) "
+            "SELECT id, 1 + (id + 2) % 5, 1, 1, 1 FROM ordenes"
+        )
+        conn.exec_driver_sql(
+            "UPDATE orden_detalle SET precio_unitario = (SELECT precio FROM productos WHERE id = orden_detalle.producto_id)"
+        )
+
+
+def _export(engine, formato: str, lineas: bool) -> tuple[float, float, int]:
+    t0 = time.perf_counter()
+    primero = None
+    size = 0
+    for bloque in exportar(engine, export_select([], lineas), formato, lineas):
+        if primero is None:
+            primero = time.perf_counter() - t0
+        size += len(bloque)
+    return primero * 1000, time.perf_counter() - t0, size
+
+
+def _pico(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico / 2**20
+
+
+def _materializar(engine) -> int:
+    with Session(engine) as db:
+        return len(db.query(Pago).all())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pagos", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        run_migrations(engine)
+        _seed(engine, args.pagos)
+        _seed_lineas(engine)
+        print(f"{args.pagos} pagos, {2 * args.pagos} líneas")
+        print(f"{'export':<16}{'1er bloque ms':>14}{'total s':>9}{'MB':>8}{'pico MB':>9}")
+        for formato in ("csv", "ndjson"):
+            for lineas in (False, True):
+                primero, total, size = _export(engine, formato, lineas)
+                pico = _pico(lambda: _export(engine, formato, lineas))
+                etiqueta = formato + (" + líneas" if lineas else "")
+                print(f"{etiqueta:<16}{primero:>14.1f}{total:>9.1f}{size / 2**20:>8.0f}{pico:>9.1f}")
+        t0 = time.perf_counter()
+        n = _materializar(engine)
+        total = time.perf_counter() - t0
+        pico = _pico(lambda: _materializar(engine))
+        print(f"referencia: {n} Pago como objetos ORM en {total:.1f} s, pico {pico:.0f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Carga de órdenes concurrentes contra un servidor uvicorn real.
+
+Levanta ``uvicorn main:app`` sobre una BD temporal, abre varios websockets
+en ``/ws/ordenes`` y envía órdenes desde N clientes concurrentes (cada orden
+a una mesa distinta, así todas son ``new_order``). Reporta throughput,
+latencia HTTP y latencia de entrega por websocket (desde que se envía el
+POST hasta que el panel recibe el evento).
+
+Con ``--workers N`` (N > 1) arranca uvicorn con N workers y ``EVENT_BUS=sqlite``;
+cada websocket debe recibir todas las órdenes sin importar a qué worker llegó.
+
+Uso (desde backend/):
+    python bench/bench_orders.py [--clients 16] [--orders 800] [--ws 8] [--workers 1] [--backend .]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000
+
+
+async def _listen(url: str, received: dict[int, list[float]], ready: asyncio.Event, expected: int, n_ws: int, dropped: list) -> None:
+    async with websockets.connect(url, max_size=None) as ws:
+        ready.set()
+        while True:
+            try:
+                raw = await ws.recv()
+            except websockets.ConnectionClosed:
+                dropped.append(url)
+                return
+            now = time.perf_counter()
+            msg = json.loads(raw)
+            orders = [msg["order"]] if msg.get("type") == "new_order" else []
+            for order in orders:
+                received.setdefault(order["mesa_numero"], []).append(now)
+            if sum(len(v) for v in received.values()) >= expected * n_ws:
+                return
+
+
+async def _run(args, base: str) -> None:
+    sys.path.insert(0, args.backend)
+    from security import generate_order_token
+
+    received: dict[int, list[float]] = {}
+    sent: dict[int, float] = {}
+    http_lat: list[float] = []
+    dropped: list = []
+    readies = [asyncio.Event() for _ in range(args.ws)]
+    ws_url = base.replace("http://", "ws://") + "/ws/ordenes"
+    listeners = [
+        asyncio.create_task(_listen(ws_url, received, readies[i], args.orders, args.ws, dropped)) for i in range(args.ws)
+    ]
+    await asyncio.gather(*(r.wait() for r in readies))
+
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(args.orders):
+        queue.put_nowait(1000 + i)
+
+    async def submitter(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            mesa = queue.get_nowait()
+            body = {"mesa_numero": mesa, "items": [{"producto_id": 1 + (mesa % 5), "cantidad": 1}, {"producto_id": 2, "cantidad": 2}]}
+            t0 = time.perf_counter()
+            sent[mesa] = t0
+            r = await client.post("/api/orden", json=body, headers={"X-QR-Token": generate_order_token(mesa)})
+            r.raise_for_status()
+            http_lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+        await asyncio.gather(*(submitter(client) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - t0
+    try:
+        await asyncio.wait_for(asyncio.gather(*listeners), timeout=30)
+    except asyncio.TimeoutError:
+        for t in listeners:
+            t.cancel()
+
+    ws_lat = [t - sent[mesa] for mesa, times in received.items() for t in times]
+    print(f"órdenes        : {args.orders} con {args.clients} clientes, {args.ws} websockets, {args.workers} workers")
+    print(f"throughput     : {args.orders / elapsed:.0f} órdenes/s")
+    print(f"latencia HTTP  : p50 {_pct(http_lat, 50):.1f} ms  p99 {_pct(http_lat, 99):.1f} ms")
+    print(f"latencia WS    : p50 {_pct(ws_lat, 50):.1f} ms  p99 {_pct(ws_lat, 99):.1f} ms  ({len(ws_lat)} entregas, {len(dropped)} websockets caídos)")
+    async with httpx.AsyncClient(base_url=base) as client:
+        r = await client.get("/api/admin/ws/stats")
+    if r.status_code == 200:
+        st = r.json()
+        print(f"servidor WS    : difusión->envío p50 {st['latencia_p50_ms']:.2f} ms  p99 {st['latencia_p99_ms']:.2f} ms  ({st['expulsados']} expulsados)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=800)
+    parser.add_argument("--ws", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", default=BACKEND)
+    args = parser.parse_args()
+    args.backend = os.path.abspath(args.backend)
+
+    tmp = tempfile.mkdtemp()
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", args.backend, "--port", str(port), "--log-level", "warning"]
+    env = dict(os.environ)
+    if args.workers > 1:
+        cmd += ["--workers", str(args.workers)]
+        env["EVENT_BUS"] = "sqlite"
+    server = subprocess.Popen(cmd, cwd=tmp, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(base + "/api/productos", timeout=1).raise_for_status()
+                break
+            except Exception:
+                time.sleep(0.1)
+        asyncio.run(_run(args, base))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
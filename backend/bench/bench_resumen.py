@@ -0,0 +1,133 @@
+"""Latencia de ``/api/finanzas/resumen`` sobre una BD con muchos pagos.
+
+Siembra ``--pagos`` pagos (por defecto 1M, repartidos a lo largo de un año)
+en una BD temporal migrada, reconstruye ``pagos_resumen`` y compara, para
+varios rangos, cargar los ``Pago`` como objetos ORM y sumar en Python,
+``SUM``/``COUNT`` sobre ``pagos`` y el endpoint (resumen por hora + bordes
+desde ``pagos``), además de los desgloses con ``agrupar``. Los rangos
+empiezan y terminan a media hora para que siempre haya bordes parciales.
+
+Uso (desde backend/):
+    python bench/bench_resumen.py [--pagos 1000000] [--runs 3] [--sin-python]
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from database import create_db_engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Pago  # noqa: E402
+from rollup import rebuild  # noqa: E402
+from routes.finanzas import resumen_finanzas  # noqa: E402
+
+INICIO = datetime.datetime(2025, 1, 1)
+RANGOS = {
+    "día": ("2025-06-10T00:30:00", "2025-06-10T23:29:59"),
+    "mes": ("2025-06-01T00:30:00", "2025-06-30T23:29:59"),
+    "año": ("2025-01-01T00:30:00", "2025-12-31T23:29:59"),
+}
+
+
+def _seed(engine, n: int) -> None:
+    paso = 365 * 86400 / n
+    rng = random.Random(7)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        # Órdenes mínimas para respetar la FK de pagos.orden_id
+        cur.executemany("INSERT INTO ordenes (id, mesa_id, fecha, estado, abierta) VALUES (?, 1, ?, 'entregado', 0)",
+                        ((i, (INICIO + datetime.timedelta(seconds=i * paso)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                         for i in range(1, n + 1)))
+        cur.executemany(
+            "INSERT INTO pagos (orden_id, metodo, monto_total, propina, fecha) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, rng.choice(("efectivo", "tarjeta")), round(rng.uniform(5, 80), 2), round(rng.uniform(0, 5), 2),
+                 (INICIO + datetime.timedelta(seconds=i * paso)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                for i in range(1, n + 1)
+            ),
+        )
+        cur.execute("COMMIT")
+        cur.execute("ANALYZE")
+        cur.close()
+    finally:
+        conn.close()
+
+
+def _python(db: Session, desde: str, hasta: str) -> tuple:
+    # Cálculo anterior: todos los pagos del rango como objetos ORM
+    pagos = (
+        db.query(Pago)
+        .filter(Pago.fecha >= datetime.datetime.fromisoformat(desde), Pago.fecha <= datetime.datetime.fromisoformat(hasta))
+        .all()
+    )
+    return sum(p.monto_total for p in pagos), sum(p.propina or 0.0 for p in pagos), len(pagos)
+
+
+def _sql_pagos(db: Session, desde: str, hasta: str) -> tuple:
+    # SUM/COUNT directo sobre pagos (índice cubriente), sin el resumen por hora
+    return db.execute(
+        select(func.sum(Pago.monto_total), func.sum(Pago.propina), func.count(Pago.id)).where(
+            Pago.fecha >= datetime.datetime.fromisoformat(desde), Pago.fecha <= datetime.datetime.fromisoformat(hasta)
+        )
+    ).one()
+
+
+def _ms(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pagos", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--sin-python", action="store_true", help="omite el cálculo anterior (lento con 1M)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        run_migrations(engine)
+        t0 = time.perf_counter()
+        _seed(engine, args.pagos)
+        print(f"{args.pagos} pagos sembrados en {time.perf_counter() - t0:.1f} s")
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            filas = rebuild(conn)
+        print(f"pagos_resumen reconstruido ({filas} filas) en {time.perf_counter() - t0:.1f} s")
+        print(f"{'rango':<6}{'consulta':<26}{'ms':>10}")
+        with Session(engine) as db:
+            for nombre, (desde, hasta) in RANGOS.items():
+                casos = [
+                    ("sql sobre pagos", lambda: _sql_pagos(db, desde, hasta)),
+                    ("endpoint", lambda: resumen_finanzas(db=db, user="bench", desde=desde, hasta=hasta)),
+                ]
+                for agrupar in ("metodo", "dia", "hora", "dia_semana", "dia,metodo"):
+                    casos.append((f"endpoint agrupar={agrupar}", lambda a=agrupar: resumen_finanzas(
+                        db=db, user="bench", desde=desde, hasta=hasta, agrupar=a)))
+                if not args.sin_python:
+                    casos.insert(0, ("python (ORM)", lambda: _python(db, desde, hasta)))
+                for etiqueta, fn in casos:
+                    print(f"{nombre:<6}{etiqueta:<26}{_ms(fn, args.runs):>10.1f}")
+                    db.expunge_all()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
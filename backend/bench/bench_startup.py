@@ -0,0 +1,61 @@
+"""Mide el arranque en frío del backend (hook ``startup``).
+
+Cada corrida usa un intérprete nuevo y una copia de la BD en un directorio
+temporal. Se mide el primer arranque sobre la BD (migra si hace falta) y
+los arranques siguientes sobre la misma BD ya inicializada.
+
+Uso (desde backend/):
+    python bench/bench_startup.py [--db restaurant.db] [--runs 10] [--backend .]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SNIPPET = """
+import sys, time
+sys.path.insert(0, {backend!r})
+import main
+t0 = time.perf_counter()
+main.startup()
+print(time.perf_counter() - t0)
+"""
+
+
+def _boot(backend: str, cwd: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(backend=backend)],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=None, help="BD a copiar (por defecto una BD nueva)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--backend", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+    backend = os.path.abspath(args.backend)
+
+    first: list[float] = []
+    warm: list[float] = []
+    for _ in range(args.runs):
+        tmp = tempfile.mkdtemp()
+        try:
+            if args.db:
+                shutil.copy(args.db, os.path.join(tmp, "restaurant.db"))
+            first.append(_boot(backend, tmp))
+            warm.append(_boot(backend, tmp))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"primer arranque : mediana {statistics.median(first) * 1000:.1f} ms")
+    print(f"arranques luego : mediana {statistics.median(warm) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Throughput de escritura con N escritores concurrentes: perfil por defecto vs perfil afinado.
+
+Cada escritor repite una transacción corta con el patrón de ``crear_orden``:
+lee (buscar la orden abierta) y luego escribe (insertar líneas y actualizar).
+"baseline" es ``create_engine`` sin pragmas, como estaba antes; "afinado" es
+``database.create_db_engine`` (WAL, synchronous=NORMAL, busy_timeout,
+BEGIN IMMEDIATE vía ``database.for_writes``, pool dimensionado).
+
+Uso (desde backend/):
+    python bench/bench_writes.py [--writers 1,4,16] [--seconds 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from database import create_db_engine, for_writes  # noqa: E402
+
+
+def _setup(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS bench_orden (id INTEGER PRIMARY KEY, mesa INTEGER, total INTEGER)"))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS bench_linea (id INTEGER PRIMARY KEY, orden_id INTEGER, cantidad INTEGER)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bench_orden_mesa ON bench_orden (mesa)"))
+        for mesa in range(1, 21):
+            conn.execute(text("INSERT INTO bench_orden (mesa, total) VALUES (:m, 0)"), {"m": mesa})
+
+
+def _writer(engine, mesa: int, deadline: float, stats: dict, lock: threading.Lock) -> None:
+    ok = err = 0
+    while time.perf_counter() < deadline:
+        try:
+            with engine.begin() as conn:
+                oid = conn.execute(text("SELECT id FROM bench_orden WHERE mesa = :m"), {"m": mesa}).scalar()
+                conn.execute(
+                    text("INSERT INTO bench_linea (orden_id, cantidad) VALUES (:o, 1), (:o, 2), (:o, 3)"), {"o": oid}
+                )
+                conn.execute(text("UPDATE bench_orden SET total = total + 6 WHERE id = :o"), {"o": oid})
+            ok += 1
+        except Exception:
+            err += 1
+    with lock:
+        stats["ok"] += ok
+        stats["err"] += err
+
+
+def _run(profile: str, writers: int, seconds: float) -> tuple[float, int]:
+    tmp = tempfile.mkdtemp()
+    try:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        if profile == "baseline":
+            engine = writes = create_engine(url, connect_args={"check_same_thread": False})
+        else:
+            engine = create_db_engine(url)
+            writes = for_writes(engine)
+        _setup(writes)
+        stats = {"ok": 0, "err": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+        threads = [
+            threading.Thread(target=_writer, args=(writes, 1 + i % 20, deadline, stats, lock)) for i in range(writers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        engine.dispose()
+        return stats["ok"] / seconds, stats["err"]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", default="1,4,16")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    print(f"{'escritores':>10} {'perfil':>9} {'tx/s':>9} {'errores':>8}")
+    for n in (int(x) for x in args.writers.split(",")):
+        for profile in ("baseline", "afinado"):
+            tps, errors = _run(profile, n, args.seconds)
+            print(f"{n:>10} {profile:>9} {tps:>9.0f} {errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Tablero en memoria de órdenes abiertas (panel de cocina).
+
+Se construye una vez al arrancar a partir de la BD y después lo actualizan
+los endpoints que mutan órdenes, de modo que las lecturas del panel
+(``GET /api/ordenes``, comandos de voz) no tocan SQLite.
+
+Cada orden lleva ``version``, que sube con cada cambio; ``order_delta``
+describe solo lo que cambió entre dos versiones para los paneles que
+aceptan actualizaciones parciales.
+"""
+import bisect
+import json
+import threading
+import datetime
+
+from catalog import catalog
+from models import Orden
+
+
+class BoardItem:
+    __slots__ = ("producto_id", "cantidad", "entregados", "precio_unitario")
+
+    def __init__(self, producto_id: int, cantidad: int, entregados: int, precio_unitario: float | None = None):
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+        self.entregados = entregados
+        self.precio_unitario = precio_unitario
+
+    @property
+    def nombre(self) -> str:
+        prod = catalog.peek(self.producto_id)
+        return prod.nombre if prod else ""
+
+    @property
+    def precio(self) -> float:
+        # El precio guardado en la línea (el que se cobra); el catálogo solo para líneas sin precio
+        if self.precio_unitario is not None:
+            return self.precio_unitario
+        prod = catalog.peek(self.producto_id)
+        return prod.precio if prod else 0.0
+
+    def to_dict(self) -> dict:
+        # El nombre se resuelve contra el catálogo en memoria
+        prod = catalog.peek(self.producto_id)
+        return {
+            "producto_id": self.producto_id,
+            "nombre": prod.nombre if prod else "",
+            "precio": self.precio,
+            "cantidad": self.cantidad,
+            "entregado": self.entregados >= self.cantidad,
+            "entregados": self.entregados,
+        }
+
+
+class BoardOrder:
+    __slots__ = ("id", "mesa_numero", "fecha", "estado", "items", "pagado", "version")
+
+    def __init__(
+        self,
+        id: int,
+        mesa_numero: int,
+        fecha: datetime.datetime,
+        estado: str,
+        items: list[BoardItem],
+        pagado: bool = False,
+        version: int = 1,
+    ):
+        self.id = id
+        self.mesa_numero = mesa_numero
+        self.fecha = fecha
+        self.estado = estado
+        self.items = items
+        self.pagado = pagado
+        self.version = version
+
+    @classmethod
+    def from_orm(cls, order: Orden) -> "BoardOrder":
+        items = [
+            BoardItem(det.producto_id, det.cantidad, int(det.entregados or 0), det.precio_unitario)
+            for det in order.detalles
+        ]
+        return cls(
+            order.id,
+            order.mesa.numero if order.mesa else None,
+            order.fecha,
+            order.estado,
+            items,
+            not order.abierta,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BoardOrder":
+        """Inversa de ``to_dict`` (eventos recibidos de otro worker)."""
+        items = [
+            BoardItem(it["producto_id"], it["cantidad"], int(it.get("entregados") or 0), it.get("precio"))
+            for it in data["items"]
+        ]
+        fecha = datetime.datetime.fromisoformat(data["fecha"]) if data.get("fecha") else None
+        return cls(
+            data["id"], data["mesa_numero"], fecha, data["estado"], items, bool(data.get("pagado")), int(data.get("version") or 1)
+        )
+
+    def sort_key(self) -> tuple:
+        return (self.fecha or datetime.datetime.min, self.id)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "mesa_numero": self.mesa_numero,
+            "fecha": self.fecha.isoformat() if self.fecha else None,
+            "estado": self.estado,
+            "items": [it.to_dict() for it in self.items],
+            "pagado": self.pagado,
+            "version": self.version,
+        }
+
+
+def order_delta(prev: BoardOrder, entry: BoardOrder) -> dict:
+    """Cambios de ``prev`` a ``entry``: campos de la orden y líneas por ``producto_id``.
+
+    Las líneas nuevas van completas (con nombre y precio); las existentes
+    solo con sus contadores. ``base`` es la versión sobre la que aplica.
+    """
+    delta = {"id": entry.id, "mesa_numero": entry.mesa_numero, "version": entry.version, "base": prev.version}
+    if prev.estado != entry.estado:
+        delta["estado"] = entry.estado
+    if prev.pagado != entry.pagado:
+        delta["pagado"] = entry.pagado
+    old = {it.producto_id: it for it in prev.items}
+    items = []
+    for it in entry.items:
+        before = old.pop(it.producto_id, None)
+        if before is None:
+            items.append(it.to_dict())
+        elif before.cantidad != it.cantidad or before.entregados != it.entregados:
+            items.append({
+                "producto_id": it.producto_id,
+                "cantidad": it.cantidad,
+                "entregado": it.entregados >= it.cantidad,
+                "entregados": it.entregados,
+            })
+    if items:
+        delta["items"] = items
+    if old:
+        delta["removed"] = sorted(old)
+    return delta
+
+
+def merge_deltas(first: dict, second: dict) -> dict:
+    """Combina dos deltas consecutivos de la misma orden (``second`` aplica sobre ``first``)."""
+    merged = {k: v for k, v in first.items() if k not in ("items", "removed")}
+    merged.update({k: v for k, v in second.items() if k not in ("items", "removed", "base")})
+    items = {it["producto_id"]: it for it in first.get("items", [])}
+    removed = set(first.get("removed", []))
+    for producto_id in second.get("removed", []):
+        items.pop(producto_id, None)
+        removed.add(producto_id)
+    for it in second.get("items", []):
+        removed.discard(it["producto_id"])
+        # Una línea nueva en ``first`` conserva nombre y precio al actualizar sus contadores
+        items[it["producto_id"]] = {**items.get(it["producto_id"], {}), **it}
+    if items:
+        merged["items"] = list(items.values())
+    if removed:
+        merged["removed"] = sorted(removed)
+    return merged
+
+
+def order_event(kind: str, entry: BoardOrder, delta: dict | None = None) -> dict:
+    """Evento ``new_order``/``update_order``; con ``delta`` los paneles que lo piden reciben solo los cambios."""
+    event = {"type": kind, "order": entry.to_dict()}
+    if delta is not None:
+        event["delta"] = delta
+    return event
+
+
+class OrderBoard:
+    def __init__(self):
+        self._orders: dict[int, BoardOrder] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self._json_version = None
+        self._json = b"[]"
+        # Órdenes ordenadas por (fecha, id) y sus claves, para paginar con bisect
+        self._sorted_version = None
+        self._sorted: list[BoardOrder] = []
+        self._sorted_keys: list[tuple] = []
+
+    def _touch(self) -> None:
+        self.version += 1
+
+    def load(self, orders: list[Orden]) -> None:
+        entries = {o.id: BoardOrder.from_orm(o) for o in orders if o.abierta}
+        with self._lock:
+            self._orders = entries
+            self._touch()
+
+    def _put(self, entry: BoardOrder, keep_version: bool = False) -> BoardOrder | None:
+        """Guarda ``entry`` (versión siguiente a la anterior) y devuelve la entrada que reemplazó."""
+        with self._lock:
+            prev = self._orders.get(entry.id)
+            if prev is not None and not keep_version:
+                entry.version = prev.version + 1
+            if entry.pagado:
+                self._orders.pop(entry.id, None)
+            else:
+                self._orders[entry.id] = entry
+            self._touch()
+        return prev
+
+    def upsert(self, entry: BoardOrder) -> BoardOrder:
+        """Refleja ``entry`` (ya confirmada en BD) y la devuelve con su versión.
+
+        Las operaciones del escritor devuelven la entrada ya construida: los objetos
+        ORM de su sesión pueden quedar expirados si otra operación del lote falla.
+        """
+        self._put(entry)
+        return entry
+
+    def update(self, entry: BoardOrder) -> tuple[BoardOrder, dict | None]:
+        """Como ``upsert`` y además el delta respecto a la versión anterior (``None`` si es nueva)."""
+        prev = self._put(entry)
+        return entry, order_delta(prev, entry) if prev is not None else None
+
+    def apply_event(self, data: dict) -> None:
+        """Aplica un evento de órdenes publicado por otro worker (mismo formato que reciben los paneles)."""
+        kind = data.get("type")
+        if kind in ("new_order", "update_order"):
+            # La versión viene del worker que originó el cambio
+            self._put(BoardOrder.from_dict(data["order"]), keep_version=True)
+        elif kind == "update_status":
+            self.set_estado(data["order"]["id"], data["order"]["estado"], data["order"].get("version"))
+        elif kind in ("order_paid", "order_cancelled"):
+            self.remove(data["orden_id"])
+        elif kind == "batch":
+            for event in data["events"]:
+                self.apply_event(event)
+
+    def set_estado(self, order_id: int, estado: str, version: int | None = None) -> int | None:
+        """Cambia el estado y devuelve la nueva versión de la orden (``None`` si no está)."""
+        with self._lock:
+            entry = self._orders.get(order_id)
+            if entry is None:
+                return None
+            entry.estado = estado
+            entry.version = version if version is not None else entry.version + 1
+            self._touch()
+            return entry.version
+
+    def remove(self, order_id: int) -> None:
+        with self._lock:
+            if self._orders.pop(order_id, None) is not None:
+                self._touch()
+
+    def get(self, order_id: int) -> BoardOrder | None:
+        return self._orders.get(order_id)
+
+    def orders(self) -> list[BoardOrder]:
+        with self._lock:
+            entries = list(self._orders.values())
+        entries.sort(key=BoardOrder.sort_key)
+        return entries
+
+    def to_json(self, mesas: set[int] | None = None) -> bytes:
+        """Tablero serializado, reconstruido solo cuando cambió el tablero o el catálogo.
+
+        Con ``mesas`` devuelve solo las órdenes de esas mesas (sin caché).
+        """
+        if mesas is not None:
+            entries = [e for e in self.orders() if e.mesa_numero in mesas]
+            return json.dumps([e.to_dict() for e in entries], ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            key = (self.version, catalog.version)
+            if self._json_version != key:
+                entries = sorted(self._orders.values(), key=BoardOrder.sort_key)
+                self._json = json.dumps([e.to_dict() for e in entries], ensure_ascii=False).encode("utf-8")
+                self._json_version = key
+            return self._json
+
+    def page(self, after: tuple | None, limit: int) -> list[BoardOrder]:
+        """Hasta ``limit + 1`` órdenes posteriores a ``after`` (``(fecha, id)``), en el orden del tablero.
+
+        La lista ordenada se reconstruye solo cuando cambió el tablero; cada página es un bisect.
+        """
+        with self._lock:
+            if self._sorted_version != self.version:
+                self._sorted = sorted(self._orders.values(), key=BoardOrder.sort_key)
+                self._sorted_keys = [e.sort_key() for e in self._sorted]
+                self._sorted_version = self.version
+            start = 0 if after is None else bisect.bisect_right(self._sorted_keys, after)
+            return self._sorted[start:start + limit + 1]
+
+    def check(self, orders: list[Orden]) -> list[str]:
+        """Compara el tablero contra las órdenes abiertas leídas de BD; devuelve las diferencias."""
+        expected = {o.id: BoardOrder.from_orm(o).to_dict() for o in orders if o.abierta}
+        with self._lock:
+            actual = {oid: e.to_dict() for oid, e in self._orders.items()}
+        diffs: list[str] = []
+        for oid in sorted(expected.keys() - actual.keys()):
+            diffs.append(f"orden {oid}: falta en el tablero")
+        for oid in sorted(actual.keys() - expected.keys()):
+            diffs.append(f"orden {oid}: sobra en el tablero")
+        for oid in sorted(expected.keys() & actual.keys()):
+            for field, value in expected[oid].items():
+                # La versión solo existe en memoria
+                if field != "version" and actual[oid].get(field) != value:
+                    diffs.append(f"orden {oid}: '{field}' difiere")
+        return diffs
+
+
+board = OrderBoard()
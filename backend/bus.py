@@ -0,0 +1,196 @@
+"""Transporte de eventos entre workers para ``OrderWebSocketManager``.
+
+Con un solo proceso basta ``InProcessBus``: el evento se entrega directo a
+los websockets del mismo worker. Con ``uvicorn --workers N`` cada worker
+tiene sus propios websockets, tablero y catálogo; ``SqliteLogBus`` publica
+cada evento en la tabla ``ws_eventos`` de la misma BD y cada worker la lee
+para entregarlo a sus clientes. El id autoincremental de la tabla es el
+``seq`` del evento, así que es el mismo en todos los workers y un panel
+puede reconectar a cualquiera con ``?since=``.
+
+Se elige con ``EVENT_BUS=local|sqlite``.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+from typing import TYPE_CHECKING, Callable
+
+from sqlalchemy.engine import Engine
+
+if TYPE_CHECKING:
+    from realtime import OrderWebSocketManager
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS = os.getenv("EVENT_BUS", "local")
+# Cada cuánto revisa un worker si otros publicaron eventos
+EVENT_BUS_POLL_MS = int(os.getenv("EVENT_BUS_POLL_MS", "25"))
+# Eventos que se conservan en ws_eventos (el resto se borra periódicamente)
+EVENT_BUS_KEEP = int(os.getenv("EVENT_BUS_KEEP", "10000"))
+# Espera máxima entre reintentos de un insert fallido (la espera se duplica desde EVENT_BUS_POLL_MS)
+EVENT_BUS_RETRY_MAX_MS = int(os.getenv("EVENT_BUS_RETRY_MAX_MS", "1000"))
+
+
+class InProcessBus:
+    """Entrega directa dentro del proceso; el manager numera los eventos."""
+
+    epoch: str | None = None
+
+    def open(self) -> None:
+        pass
+
+    def start(self, manager: "OrderWebSocketManager") -> None:
+        self._manager = manager
+
+    def stop(self) -> None:
+        pass
+
+    def publish(self, data: dict) -> None:
+        # Se invoca siempre desde el event loop (ver OrderWebSocketManager.publish)
+        self._manager.deliver(data)
+
+
+class SqliteLogBus:
+    """Log de eventos en SQLite compartido por los workers de la misma máquina.
+
+    Un hilo por worker inserta los eventos locales y lee los nuevos (propios
+    y ajenos) en orden de id. Los ajenos se aplican antes con ``on_remote``
+    para mantener al día el tablero y el catálogo del worker.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        on_remote: Callable[[dict], None] | None = None,
+        poll_ms: int = EVENT_BUS_POLL_MS,
+        keep: int = EVENT_BUS_KEEP,
+    ):
+        self._engine = engine
+        self._on_remote = on_remote
+        self._poll = poll_ms / 1000.0
+        self._keep = keep
+        self._retry_max = max(EVENT_BUS_RETRY_MAX_MS / 1000.0, self._poll)
+        self.origin = f"{os.getpid()}-{secrets.token_hex(3)}"
+        # La secuencia es la de la tabla: igual para todos los workers de la misma BD
+        self.epoch = "log-" + hashlib.sha256(str(engine.url).encode("utf-8")).hexdigest()[:10]
+        self._outbox: queue.SimpleQueue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._conn = None
+        self.last_id = 0
+
+    def open(self) -> None:
+        """Abre la conexión y fija el cursor; llamar antes de construir el tablero."""
+        if self._conn is not None:
+            return
+        # Conexión DBAPI en autocommit: las lecturas de sondeo no toman el lock de escritura
+        self._conn = self._engine.raw_connection()
+        cur = self._conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM ws_eventos")
+        self.last_id = cur.fetchone()[0]
+        cur.close()
+
+    def start(self, manager: "OrderWebSocketManager") -> None:
+        self.open()
+        self._manager = manager
+        manager.seq = max(manager.seq, self.last_id)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ws-event-bus", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._outbox.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def publish(self, data: dict) -> None:
+        self._outbox.put(data)
+
+    def _run(self) -> None:
+        polls = 0
+        pending: list[dict] = []
+        delay = 0.0
+        while not self._stop.is_set():
+            if pending:
+                # El lote que falló se reintenta tal cual antes de tomar eventos nuevos: no se reordenan
+                if self._stop.wait(delay):
+                    break
+            else:
+                try:
+                    item = self._outbox.get(timeout=self._poll)
+                    while item is not None:
+                        pending.append(item)
+                        item = self._outbox.get_nowait()
+                except queue.Empty:
+                    pass
+            if pending:
+                try:
+                    self._insert(pending)
+                    pending = []
+                    delay = 0.0
+                except Exception:
+                    # BD ocupada más allá de busy_timeout: espera creciente y acotada
+                    delay = min(max(delay * 2, self._poll), self._retry_max)
+            try:
+                self._read()
+                polls += 1
+                if polls % 2000 == 0:
+                    self._prune()
+            except Exception:
+                # Un fallo puntual del SELECT no debe matar el hilo; last_id no avanzó
+                pass
+
+    def _insert(self, pending: list[dict]) -> None:
+        cur = self._conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.executemany(
+                "INSERT INTO ws_eventos (origen, payload) VALUES (?, ?)",
+                [(self.origin, json.dumps(data, ensure_ascii=False)) for data in pending],
+            )
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.close()
+
+    def _read(self) -> None:
+        cur = self._conn.cursor()
+        cur.execute("SELECT id, origen, payload FROM ws_eventos WHERE id > ? ORDER BY id", (self.last_id,))
+        rows = cur.fetchall()
+        cur.close()
+        for seq, origen, payload in rows:
+            try:
+                data = json.loads(payload)
+                if origen != self.origin and self._on_remote is not None:
+                    self._on_remote(data)
+                self._manager.deliver_threadsafe(data, seq)
+            except Exception:
+                # Un evento que no se puede aplicar se releería en cada sondeo y bloquearía a los siguientes
+                logger.exception("evento %s de ws_eventos (origen %s) descartado", seq, origen)
+            self.last_id = seq
+
+    def _prune(self) -> None:
+        cur = self._conn.cursor()
+        cur.execute("DELETE FROM ws_eventos WHERE id <= ?", (self.last_id - self._keep,))
+        cur.close()
+
+
+def create_event_bus(engine: Engine, on_remote: Callable[[dict], None] | None = None):
+    if EVENT_BUS == "local":
+        return InProcessBus()
+    if EVENT_BUS == "sqlite":
+        if engine.url.get_backend_name() != "sqlite":
+            raise RuntimeError("EVENT_BUS=sqlite requiere DATABASE_URL de SQLite")
+        return SqliteLogBus(engine, on_remote=on_remote)
+    raise RuntimeError(f"EVENT_BUS desconocido: {EVENT_BUS}")
@@ -0,0 +1,124 @@
+"""Catálogo de productos en memoria con versión monótona.
+
+Los endpoints CRUD de productos aplican sus cambios aquí después de
+confirmarlos en BD; cada cambio incrementa ``version`` para que clientes
+y otras cachés (menú, tablero) detecten que el catálogo cambió.
+"""
+import json
+import hashlib
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Producto
+
+
+class CatalogEntry:
+    __slots__ = ("id", "nombre", "precio", "imagen")
+
+    def __init__(self, id: int, nombre: str, precio: float, imagen: str | None):
+        self.id = id
+        self.nombre = nombre
+        self.precio = precio
+        self.imagen = imagen
+
+    @classmethod
+    def from_orm(cls, p: Producto) -> "CatalogEntry":
+        return cls(p.id, p.nombre, float(p.precio), p.imagen)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "nombre": self.nombre, "precio": self.precio, "imagen": self.imagen}
+
+
+class ProductCatalog:
+    def __init__(self):
+        self._products: dict[int, CatalogEntry] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.version = 0
+        self._menu_version = -1
+        self._menu: tuple[bytes, str] = (b"[]", "")
+
+    def _replace(self, productos) -> None:
+        entries = {p.id: CatalogEntry.from_orm(p) for p in productos}
+        with self._lock:
+            self._products = entries
+            self._loaded = True
+            self.version += 1
+
+    def load(self, db: Session) -> None:
+        self._replace(db.query(Producto).all())
+
+    async def aload(self, db: AsyncSession) -> None:
+        self._replace((await db.scalars(select(Producto))).all())
+
+    def ensure(self, db: Session) -> None:
+        if not self._loaded:
+            self.load(db)
+
+    def peek(self, producto_id: int) -> CatalogEntry | None:
+        """Busca solo en memoria (para rutas sin sesión de BD)."""
+        return self._products.get(producto_id)
+
+    def get(self, db: Session, producto_id: int) -> CatalogEntry | None:
+        self.ensure(db)
+        entry = self._products.get(producto_id)
+        if entry is None:
+            p = db.get(Producto, producto_id)
+            if p is None:
+                return None
+            entry = self.put(p)
+        return entry
+
+    def _split(self, ids) -> tuple[dict[int, CatalogEntry], list[int]]:
+        found: dict[int, CatalogEntry] = {}
+        missing: list[int] = []
+        for pid in ids:
+            entry = self._products.get(pid)
+            if entry is None:
+                missing.append(pid)
+            else:
+                found[pid] = entry
+        return found, missing
+
+    async def aget_many(self, db: AsyncSession, ids) -> dict[int, CatalogEntry]:
+        """Resuelve varios ids; los que no estén en memoria se leen con una sola consulta IN."""
+        if not self._loaded:
+            await self.aload(db)
+        found, missing = self._split(ids)
+        if missing:
+            for p in (await db.scalars(select(Producto).where(Producto.id.in_(missing)))).all():
+                found[p.id] = self.put(p)
+        return found
+
+    def menu(self, db: Session) -> tuple[bytes, str]:
+        """Menú serializado y su ETag fuerte, reconstruidos solo cuando cambia la versión.
+
+        El ETag se deriva del contenido, así que es estable entre reinicios y workers.
+        """
+        self.ensure(db)
+        with self._lock:
+            if self._menu_version != self.version:
+                entries = sorted(self._products.values(), key=lambda e: e.id)
+                body = json.dumps([e.to_dict() for e in entries], ensure_ascii=False).encode("utf-8")
+                etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                self._menu = (body, etag)
+                self._menu_version = self.version
+            return self._menu
+
+    def put(self, p: Producto) -> CatalogEntry:
+        entry = CatalogEntry.from_orm(p)
+        with self._lock:
+            self._products[entry.id] = entry
+            self.version += 1
+        return entry
+
+    def remove(self, producto_id: int) -> None:
+        with self._lock:
+            if self._products.pop(producto_id, None) is not None:
+                self.version += 1
+
+
+catalog = ProductCatalog()
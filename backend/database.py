@@ -1,10 +1,98 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Configuración por entorno; los valores por defecto son el perfil recomendado para SQLite
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./restaurant.db")
+# Conexión async (aiosqlite) para los endpoints async; por defecto la misma BD que DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    make_url(DATABASE_URL).set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if make_url(DATABASE_URL).get_backend_name() == "sqlite"
+    else DATABASE_URL
+)
+# Conexión de solo lectura para reportes; por defecto la misma BD con PRAGMA query_only
+DATABASE_READONLY_URL = os.getenv("DATABASE_READONLY_URL", DATABASE_URL)
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# IMMEDIATE toma el lock de escritura al iniciar la transacción: evita el "database is locked"
+# inmediato cuando una transacción que leyó primero intenta escribir. Solo lo usan las sesiones
+# que escriben (ver ``for_writes``); las lecturas en el engine de escritura abren con BEGIN simple
+SQLITE_BEGIN = os.getenv("SQLITE_BEGIN", "IMMEDIATE")
+
+# El threadpool de FastAPI/anyio usa 40 hilos; el pool debe alcanzar para no encolar peticiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+
+def _configure_sqlite(engine: Engine, *, readonly: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        # Las transacciones las abre el evento "begin"; pysqlite no debe emitir su propio BEGIN
+        dbapi_conn.isolation_level = None
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if not readonly:
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA foreign_keys = ON")
+        if readonly:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        mode = None if readonly else conn.get_execution_options().get("sqlite_begin")
+        conn.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
+
+
+def for_writes(engine):
+    """Engine (o AsyncEngine) cuyas transacciones toman el lock de escritura al iniciar en SQLite."""
+    return engine.execution_options(sqlite_begin=SQLITE_BEGIN)
 
-DATABASE_URL = "sqlite:///./restaurant.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_db_engine(url: str, *, readonly: bool = False) -> Engine:
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    _configure_sqlite(engine, readonly=readonly)
+    return engine
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    # aiosqlite usa NullPool por defecto; un pool evita reabrir conexión (y su hilo) en cada petición
+    engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+    )
+    # Mismo perfil de pragmas que el engine síncrono
+    _configure_sqlite(engine.sync_engine, readonly=False)
+    return engine
+
+
+engine = create_db_engine(DATABASE_URL)
+read_engine = create_db_engine(DATABASE_READONLY_URL, readonly=True)
+# Sesiones de escritura; las de solo lectura van por ReadSessionLocal / get_read_db
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=for_writes(engine))
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
+# expire_on_commit=False: tras el commit los objetos siguen legibles sin lazy loads (no permitidos en async)
+AsyncSessionLocal = async_sessionmaker(for_writes(async_engine), autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dependency
@@ -14,4 +102,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Sesión de solo lectura (reportes, menú, verificación del tablero): no compite por el lock de escritura."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
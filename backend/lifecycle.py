@@ -0,0 +1,218 @@
+"""Historial de órdenes (tabla ``orden_eventos``) y latencias de cocina.
+
+Cada mutación de una orden agrega sus eventos en la misma transacción que
+el cambio (si la operación falla, el evento se revierte con ella):
+
+- ``creada``: orden nueva, seguida de un ``items`` por producto.
+- ``items``: unidades agregadas de un producto (orden nueva o merge).
+- ``estado``: estado puesto a mano (endpoint, lote o voz).
+- ``entrega``: ``entregados`` de un ítem después del cambio.
+- ``cobrada`` / ``cancelada``: la orden sale del tablero.
+
+Todos guardan el estado de la orden después del cambio. ``LatencyTracker``
+lee solo los eventos nuevos (``id`` mayor al último procesado) en cada
+consulta, así que funciona igual con varios workers y el costo no crece con
+el historial. De ellos obtiene dos muestras:
+
+- orden -> entrega: desde que la orden tiene algo pendiente (creación o
+  items nuevos sobre una orden entregada) hasta que pasa a ``entregado``.
+- preparación por producto: cada unidad se empareja en orden de llegada
+  (FIFO) con su entrega; solo cuenta la primera vez que ``entregados``
+  supera lo ya entregado, así una corrección hacia abajo no duplica
+  muestras.
+"""
+import bisect
+import datetime
+import os
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Orden, OrdenEvento
+
+# Horas de muestras que se conservan en memoria (ventana máxima de la consulta)
+LATENCY_RETENTION_H = int(os.getenv("LATENCY_RETENTION_H", "24"))
+PERCENTILES = (50, 90, 99)
+
+
+def registrar(db, orden_id: int, tipo: str, estado: str | None = None,
+              producto_id: int | None = None, cantidad: int | None = None) -> None:
+    """Agrega un evento a la sesión (``Session`` o ``AsyncSession``); se escribe con el flush/commit del cambio."""
+    db.add(OrdenEvento(orden_id=orden_id, tipo=tipo, estado=estado, producto_id=producto_id, cantidad=cantidad))
+
+
+def registrar_items(db, order: Orden, cantidades: dict[int, int], creada: bool) -> None:
+    if creada:
+        registrar(db, order.id, "creada", order.estado)
+    for producto_id, cantidad in cantidades.items():
+        registrar(db, order.id, "items", order.estado, producto_id, cantidad)
+
+
+def _utc_naive() -> datetime.datetime:
+    # Igual que Pago.fecha / OrdenEvento.fecha al leerse de SQLite
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class _Producto:
+    """Unidades pedidas y entregadas de un producto dentro de una orden."""
+
+    __slots__ = ("pedidos", "pedidas", "entregadas", "siguiente")
+
+    def __init__(self):
+        # (unidades acumuladas al cerrar el pedido, fecha del pedido)
+        self.pedidos: list[tuple[int, datetime.datetime]] = []
+        self.pedidas = 0
+        self.entregadas = 0
+        self.siguiente = 0
+
+
+class _Orden:
+    __slots__ = ("desde", "productos")
+
+    def __init__(self):
+        # Inicio de la ronda pendiente actual; None si la orden está entregada
+        self.desde: datetime.datetime | None = None
+        self.productos: dict[int, _Producto] = {}
+
+
+class _Serie:
+    """Muestras en orden de llegada (fecha de fin) con recorte por ventana."""
+
+    __slots__ = ("fin", "segundos", "producto", "unidades")
+
+    def __init__(self):
+        self.fin: list[datetime.datetime] = []
+        self.segundos: list[float] = []
+        self.producto: list[int] = []
+        self.unidades: list[int] = []
+
+    def agregar(self, fin: datetime.datetime, segundos: float, producto: int = 0, unidades: int = 1) -> None:
+        self.fin.append(fin)
+        self.segundos.append(segundos)
+        self.producto.append(producto)
+        self.unidades.append(unidades)
+
+    def desde(self, corte: datetime.datetime) -> int:
+        return bisect.bisect_left(self.fin, corte)
+
+    def recortar(self, corte: datetime.datetime) -> None:
+        i = self.desde(corte)
+        if i:
+            for name in self.__slots__:
+                del getattr(self, name)[:i]
+
+
+def _percentiles(segundos: np.ndarray, unidades: np.ndarray | None = None) -> dict:
+    if unidades is not None:
+        segundos = np.repeat(segundos, unidades)
+    if not len(segundos):
+        return {"muestras": 0, **{f"p{p}": None for p in PERCENTILES}}
+    valores = np.percentile(segundos, PERCENTILES)
+    return {"muestras": int(len(segundos)), **{f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, valores)}}
+
+
+def _eventos_select():
+    # Filas, no objetos ORM: la primera carga puede leer el historial de un día completo
+    return select(
+        OrdenEvento.id, OrdenEvento.orden_id, OrdenEvento.tipo, OrdenEvento.estado,
+        OrdenEvento.producto_id, OrdenEvento.cantidad, OrdenEvento.fecha,
+    )
+
+
+class LatencyTracker:
+    def __init__(self, retention_h: int = LATENCY_RETENTION_H):
+        self.retention = datetime.timedelta(hours=retention_h)
+        self._lock = threading.Lock()
+        self._ultimo: int | None = None
+        self._ordenes: dict[int, _Orden] = {}
+        self._entregas = _Serie()
+        self._preparacion = _Serie()
+        self.eventos = 0
+
+    def _aplicar(self, ev) -> None:
+        self.eventos += 1
+        if ev.tipo in ("cobrada", "cancelada"):
+            self._ordenes.pop(ev.orden_id, None)
+            return
+        orden = self._ordenes.get(ev.orden_id)
+        if orden is None:
+            orden = self._ordenes[ev.orden_id] = _Orden()
+
+        if ev.tipo == "items" and ev.producto_id is not None:
+            prod = orden.productos.setdefault(ev.producto_id, _Producto())
+            prod.pedidas += int(ev.cantidad or 0)
+            prod.pedidos.append((prod.pedidas, ev.fecha))
+        elif ev.tipo == "entrega" and ev.producto_id is not None:
+            prod = orden.productos.get(ev.producto_id)
+            if prod is not None and (ev.cantidad or 0) > prod.entregadas:
+                self._entregar(prod, int(ev.cantidad), ev.producto_id, ev.fecha)
+
+        if ev.estado == "entregado":
+            if orden.desde is not None:
+                self._entregas.agregar(ev.fecha, (ev.fecha - orden.desde).total_seconds())
+                orden.desde = None
+        elif orden.desde is None and ev.tipo in ("creada", "items"):
+            # Solo la creación o items nuevos abren una ronda; un estado corregido a mano no
+            orden.desde = ev.fecha
+
+    def _entregar(self, prod: _Producto, hasta: int, producto_id: int, fecha: datetime.datetime) -> None:
+        # Unidades (prod.entregadas, hasta] contra los pedidos en orden de llegada
+        while prod.entregadas < hasta and prod.siguiente < len(prod.pedidos):
+            fin_pedido, pedido_en = prod.pedidos[prod.siguiente]
+            n = min(hasta, fin_pedido) - prod.entregadas
+            if n > 0:
+                self._preparacion.agregar(fecha, (fecha - pedido_en).total_seconds(), producto_id, n)
+                prod.entregadas += n
+            if prod.entregadas >= fin_pedido:
+                prod.siguiente += 1
+        prod.entregadas = max(prod.entregadas, hasta)
+
+    def refresh(self, db: Session) -> None:
+        """Procesa los eventos nuevos; la primera vez, el historial de las órdenes activas en la retención."""
+        if self._ultimo is None:
+            corte = _utc_naive() - self.retention
+            recientes = select(OrdenEvento.orden_id).where(OrdenEvento.fecha >= corte)
+            stmt = _eventos_select().where(OrdenEvento.orden_id.in_(recientes))
+        else:
+            stmt = _eventos_select().where(OrdenEvento.id > self._ultimo)
+        ultimo = self._ultimo or 0
+        for ev in db.execute(stmt.order_by(OrdenEvento.id)):
+            self._aplicar(ev)
+            ultimo = ev.id
+        if self._ultimo is None:
+            # Sin eventos recientes: seguir desde el último existente, no desde el inicio de la tabla
+            ultimo = max(ultimo, db.scalar(select(OrdenEvento.id).order_by(OrdenEvento.id.desc()).limit(1)) or 0)
+        self._ultimo = ultimo
+        corte = _utc_naive() - self.retention
+        self._entregas.recortar(corte)
+        self._preparacion.recortar(corte)
+
+    def latencias(self, db: Session, minutos: int) -> dict:
+        with self._lock:
+            self.refresh(db)
+            ahora = _utc_naive()
+            corte = ahora - datetime.timedelta(minutes=minutos)
+            i = self._entregas.desde(corte)
+            entregas = _percentiles(np.asarray(self._entregas.segundos[i:], dtype=np.float64))
+
+            j = self._preparacion.desde(corte)
+            producto = np.asarray(self._preparacion.producto[j:], dtype=np.int64)
+            segundos = np.asarray(self._preparacion.segundos[j:], dtype=np.float64)
+            unidades = np.asarray(self._preparacion.unidades[j:], dtype=np.int64)
+            productos = {
+                int(pid): _percentiles(segundos[producto == pid], unidades[producto == pid])
+                for pid in np.unique(producto)
+            }
+            esperas = [(ahora - o.desde).total_seconds() for o in self._ordenes.values() if o.desde is not None]
+        return {
+            "minutos": minutos,
+            "entrega": entregas,
+            "productos": productos,
+            "en_espera": len(esperas),
+            "espera_max": round(max(esperas), 1) if esperas else None,
+        }
+
+
+latency_tracker = LatencyTracker()
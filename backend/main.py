@@ -4,31 +4,17 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
 
-from database import Base, engine, SessionLocal
-from models import Mesa, Producto
+from board import board
+from bus import create_event_bus
+from catalog import catalog
+from database import engine, ReadSessionLocal
+from migrations import run_migrations
+from realtime import OrderWebSocketManager, parse_topics
+from wire import negotiate
 from routes import ordenes, productos
 from routes import finanzas
 from routes import admin
-
-class OrderWebSocketManager:
-    def __init__(self):
-        self.active = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active:
-            self.active.remove(websocket)
-
-    async def broadcast(self, data: dict):
-        for ws in list(self.active):
-            try:
-                await ws.send_json(data)
-            except Exception:
-                # On error, drop connection
-                self.disconnect(ws)
+from writer import writer
 
 app = FastAPI()
 
@@ -40,9 +26,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Catalog-Version", "X-Next-Cursor"],
 )
 
-manager = OrderWebSocketManager()
+def apply_remote_event(data: dict) -> None:
+    """Evento publicado por otro worker: actualizar el tablero y el catálogo de este."""
+    if data.get("type") == "catalog_changed":
+        db = ReadSessionLocal()
+        try:
+            catalog.load(db)
+        finally:
+            db.close()
+    else:
+        board.apply_event(data)
+
+
+event_bus = create_event_bus(engine, on_remote=apply_remote_event)
+def _board_order(order_id: int) -> dict | None:
+    entry = board.get(order_id)
+    return entry.to_dict() if entry else None
+
+
+manager = OrderWebSocketManager(snapshot=board.to_json, bus=event_bus, order_lookup=_board_order)
 app.state.order_manager = manager
 
 # Rutas
@@ -76,49 +81,52 @@ if FRONTEND_DIST.exists():
 
 @app.on_event("startup")
 def startup():
-    # Crear tablas y sembrar datos si no existen
-    Base.metadata.create_all(bind=engine)
-    # Migración ligera: añadir columna 'entregado' y 'entregados' a orden_detalle si no existen
-    from sqlalchemy import text
-    try:
-        with engine.connect() as conn:
-            conn.exec_driver_sql("ALTER TABLE orden_detalle ADD COLUMN entregado INTEGER DEFAULT 0")
-    except Exception:
-        # Si ya existe o SQLite no permite, ignorar
-        pass
-    try:
-        with engine.connect() as conn:
-            conn.exec_driver_sql("ALTER TABLE orden_detalle ADD COLUMN entregados INTEGER DEFAULT 0")
-    except Exception:
-        # Si ya existe o SQLite no permite, ignorar
-        pass
+    # Aplicar solo las migraciones pendientes (la siembra inicial es una de ellas)
+    run_migrations(engine)
+    # Fijar la posición en el bus antes de leer el tablero: lo que se publique después se aplica encima
+    event_bus.open()
 
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
-        if db.query(Mesa).count() == 0:
-            mesas = [Mesa(numero=i) for i in range(1, 4)]
-            db.add_all(mesas)
-            db.commit()
-        if db.query(Producto).count() == 0:
-            productos_seed = [
-                Producto(nombre="Pizza Margherita", precio=8.99, imagen="https://picsum.photos/seed/pizza/200"),
-                Producto(nombre="Hamburguesa", precio=9.49, imagen="https://picsum.photos/seed/burger/200"),
-                Producto(nombre="Ensalada César", precio=7.25, imagen="https://picsum.photos/seed/salad/200"),
-                Producto(nombre="Pasta Boloñesa", precio=10.75, imagen="https://picsum.photos/seed/pasta/200"),
-                Producto(nombre="Tacos Al Pastor", precio=6.50, imagen="https://picsum.photos/seed/tacos/200"),
-            ]
-            db.add_all(productos_seed)
-            db.commit()
+        catalog.load(db)
+        # Tablero de cocina en memoria: se construye una vez y luego lo mantienen las mutaciones
+        board.load(ordenes.open_orders(db))
     finally:
         db.close()
 
 
+@app.on_event("startup")
+async def start_background():
+    # Única tarea que aplica las mutaciones de órdenes (ver writer.py)
+    writer.start()
+    await manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_background():
+    await writer.stop()
+    await manager.stop()
+
+
 @app.websocket("/ws/ordenes")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    since: int | None = None,
+    epoch: str | None = None,
+    topics: str | None = None,
+    delta: bool = False,
+    encoding: str | None = None,
+):
+    # ?since=<seq>&epoch=<epoch>: repetir lo perdido desde el último evento visto (0 = tablero completo)
+    # ?topics=cocina,caja,mesa:N: solo esos eventos (por defecto todos)
+    # ?delta=1: actualizaciones parciales (order_delta) en lugar de la orden completa
+    # ?encoding=msgpack: frames binarios con campos etiquetados (JSON si msgpack no está instalado)
+    await manager.connect(
+        websocket, since=since, epoch=epoch, topics=parse_topics(topics), delta=delta, encoding=negotiate(encoding)
+    )
     try:
         while True:
-            await websocket.receive_text()  # mantener conexión abierta
+            manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -0,0 +1,253 @@
+"""Migraciones de esquema versionadas.
+
+Cada paso se aplica una sola vez y la versión alcanzada se guarda en la
+tabla ``schema_version``. Si la BD ya está al día, arrancar solo cuesta
+una lectura; si hay pasos pendientes, varios workers arrancando a la vez
+se coordinan con un lock de archivo junto a la BD.
+"""
+import os
+import contextlib
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import Base, for_writes
+from models import Mesa, Orden, OrdenEvento, Pago, PagoResumen, Producto
+from rollup import rebuild
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, descripcion: str):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, descripcion, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+
+def _existing_indexes(conn: Connection) -> set[str]:
+    return {name for (name,) in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+@migration(1, "esquema inicial")
+def _esquema_inicial(conn: Connection) -> None:
+    # En una BD nueva crea el esquema actual completo; los pasos siguientes son idempotentes
+    Base.metadata.create_all(bind=conn)
+
+
+@migration(2, "columnas entregado/entregados en orden_detalle")
+def _columnas_entrega(conn: Connection) -> None:
+    if not _has_column(conn, "orden_detalle", "entregado"):
+        conn.exec_driver_sql("ALTER TABLE orden_detalle ADD COLUMN entregado INTEGER DEFAULT 0")
+    if not _has_column(conn, "orden_detalle", "entregados"):
+        conn.exec_driver_sql("ALTER TABLE orden_detalle ADD COLUMN entregados INTEGER DEFAULT 0")
+
+
+def _merge_duplicate_detalles(conn: Connection) -> None:
+    """Fusiona líneas repetidas (orden_id, producto_id) para poder crear el índice único."""
+    conn.exec_driver_sql(
+        """
+        UPDATE orden_detalle SET
+            cantidad = (SELECT SUM(d.cantidad) FROM orden_detalle d
+                        WHERE d.orden_id = orden_detalle.orden_id AND d.producto_id = orden_detalle.producto_id),
+            entregados = (SELECT SUM(COALESCE(d.entregados, 0)) FROM orden_detalle d
+                          WHERE d.orden_id = orden_detalle.orden_id AND d.producto_id = orden_detalle.producto_id)
+        WHERE id IN (SELECT MIN(id) FROM orden_detalle GROUP BY orden_id, producto_id HAVING COUNT(*) > 1)
+        """
+    )
+    conn.exec_driver_sql(
+        "DELETE FROM orden_detalle WHERE id NOT IN (SELECT MIN(id) FROM orden_detalle GROUP BY orden_id, producto_id)"
+    )
+    conn.exec_driver_sql("UPDATE orden_detalle SET entregado = (COALESCE(entregados, 0) >= cantidad)")
+
+
+@migration(3, "bandera de orden abierta e índices")
+def _orden_abierta_e_indices(conn: Connection) -> None:
+    if not _has_column(conn, "ordenes", "abierta"):
+        conn.exec_driver_sql("ALTER TABLE ordenes ADD COLUMN abierta BOOLEAN NOT NULL DEFAULT 1")
+        conn.exec_driver_sql(
+            "UPDATE ordenes SET abierta = NOT EXISTS (SELECT 1 FROM pagos WHERE pagos.orden_id = ordenes.id)"
+        )
+    existing = _existing_indexes(conn)
+    if "uq_orden_detalle_orden_producto" not in existing:
+        _merge_duplicate_detalles(conn)
+    # create_all no añade índices a tablas que ya existían
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+
+
+@migration(4, "datos iniciales")
+def _datos_iniciales(conn: Connection) -> None:
+    db = Session(bind=conn)
+    if db.query(Mesa).count() == 0:
+        db.add_all([Mesa(numero=i) for i in range(1, 4)])
+    if db.query(Producto).count() == 0:
+        db.add_all([
+            Producto(nombre="Pizza Margherita", precio=8.99, imagen="https://picsum.photos/seed/pizza/200"),
+            Producto(nombre="Hamburguesa", precio=9.49, imagen="https://picsum.photos/seed/burger/200"),
+            Producto(nombre="Ensalada César", precio=7.25, imagen="https://picsum.photos/seed/salad/200"),
+            Producto(nombre="Pasta Boloñesa", precio=10.75, imagen="https://picsum.photos/seed/pasta/200"),
+            Producto(nombre="Tacos Al Pastor", precio=6.50, imagen="https://picsum.photos/seed/tacos/200"),
+        ])
+    db.flush()
+
+
+@migration(5, "log de eventos entre workers")
+def _log_eventos(conn: Connection) -> None:
+    # Usada por EVENT_BUS=sqlite (bus.py); AUTOINCREMENT garantiza que un id nunca se reutiliza
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS ws_eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origen TEXT NOT NULL,
+            payload TEXT NOT NULL
+        )
+        """
+    )
+
+
+
+@migration(6, "índice cubriente de pagos para resúmenes")
+def _indice_resumen_pagos(conn: Connection) -> None:
+    existing = _existing_indexes(conn)
+    for index in Pago.__table__.indexes:
+        if index.name == "ix_pagos_fecha_montos" and index.name not in existing:
+            index.create(conn)
+
+
+
+@migration(7, "resumen de pagos por hora y método")
+def _resumen_pagos(conn: Connection) -> None:
+    PagoResumen.__table__.create(conn, checkfirst=True)
+    # Carga inicial desde los pagos existentes
+    rebuild(conn)
+
+
+@migration(8, "historial de eventos de órdenes")
+def _eventos_ordenes(conn: Connection) -> None:
+    OrdenEvento.__table__.create(conn, checkfirst=True)
+    # No hay historial previo: las órdenes abiertas arrancan con su creación (Orden.fecha) y su estado actual
+    conn.exec_driver_sql(
+        """
+        INSERT INTO orden_eventos (orden_id, tipo, estado, fecha)
+        SELECT o.id, 'creada', o.estado, COALESCE(o.fecha, CURRENT_TIMESTAMP) FROM ordenes o
+        WHERE o.abierta = 1
+          AND NOT EXISTS (SELECT 1 FROM orden_eventos e WHERE e.orden_id = o.id)
+        """
+    )
+
+
+@migration(9, "precio por línea y subtotal de órdenes")
+def _precios_guardados(conn: Connection) -> None:
+    if not _has_column(conn, "orden_detalle", "precio_unitario"):
+        conn.exec_driver_sql("ALTER TABLE orden_detalle ADD COLUMN precio_unitario FLOAT")
+    if not _has_column(conn, "ordenes", "subtotal"):
+        conn.exec_driver_sql("ALTER TABLE ordenes ADD COLUMN subtotal FLOAT NOT NULL DEFAULT 0")
+    # El precio original no se guardaba: las líneas existentes toman el precio actual del catálogo
+    conn.exec_driver_sql(
+        """
+        UPDATE orden_detalle SET precio_unitario = (SELECT p.precio FROM productos p WHERE p.id = orden_detalle.producto_id)
+        WHERE precio_unitario IS NULL
+        """
+    )
+    # Las órdenes cobradas conservan lo que efectivamente se cobró
+    conn.exec_driver_sql(
+        """
+        UPDATE ordenes SET subtotal = COALESCE(
+            (SELECT pg.monto_total FROM pagos pg WHERE pg.orden_id = ordenes.id),
+            (SELECT SUM(d.cantidad * d.precio_unitario) FROM orden_detalle d WHERE d.orden_id = ordenes.id),
+            0
+        )
+        """
+    )
+
+
+@migration(10, "quitar ix_pagos_fecha (cubierto por ix_pagos_fecha_montos)")
+def _quitar_indice_fecha_pagos(conn: Connection) -> None:
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_pagos_fecha")
+
+
+@migration(11, "ix_ordenes_abiertas por (mesa_id, fecha)")
+def _indice_abiertas_con_fecha(conn: Connection) -> None:
+    # Sólo con mesa_id, SQLite prefería ix_ordenes_mesa_fecha (resuelve el ORDER BY) y recorría el historial
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_ordenes_abiertas")
+    for index in Orden.__table__.indexes:
+        if index.name == "ix_ordenes_abiertas":
+            index.create(conn)
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn: Connection) -> int:
+    try:
+        value = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except OperationalError:
+        # BD nueva o anterior a las migraciones versionadas
+        conn.rollback()
+        return 0
+    return int(value or 0)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    with open(path, "a+") as fh:
+        if os.name == "nt":
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _lock_path(engine: Engine) -> str:
+    database = engine.url.database
+    if database and database != ":memory:":
+        return os.path.abspath(database) + ".migrate.lock"
+    return os.path.join(os.getcwd(), ".migrate.lock")
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Aplica los pasos pendientes y devuelve las versiones aplicadas."""
+    target = latest_version()
+    with engine.connect() as conn:
+        if current_version(conn) >= target:
+            return []
+
+    applied: list[int] = []
+    writes = for_writes(engine)
+    with _file_lock(_lock_path(engine)):
+        # Otro worker pudo haber migrado mientras esperábamos el lock
+        with writes.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        with engine.connect() as conn:
+            version = current_version(conn)
+        for step, _descripcion, fn in MIGRATIONS:
+            if step <= version:
+                continue
+            with writes.begin() as conn:
+                fn(conn)
+                conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": step})
+            applied.append(step)
+    return applied
@@ -1,10 +1,15 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 
 from database import Base
 
 
+def utcnow() -> datetime.datetime:
+    # Se evalúa en cada INSERT (no una sola vez al importar el módulo)
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
 class Mesa(Base):
     __tablename__ = "mesas"
 
@@ -31,8 +36,13 @@ class Orden(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     mesa_id = Column(Integer, ForeignKey("mesas.id"), nullable=False)
-    fecha = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    fecha = Column(DateTime, default=utcnow)
     estado = Column(String, default="pendiente")
+    # Orden abierta (sin cobrar) de su mesa; se apaga al cobrar para ubicarla sin recorrer el historial.
+    # Las canceladas se borran, así que ``not abierta`` equivale a cobrada (sin consultar pagos)
+    abierta = Column(Boolean, nullable=False, default=True, server_default=text("1"))
+    # Suma de precio_unitario * cantidad de sus líneas, mantenida al crear/mergear; es lo que se cobra
+    subtotal = Column(Float, nullable=False, default=0.0, server_default=text("0"))
 
     mesa = relationship("Mesa", back_populates="ordenes")
     detalles = relationship(
@@ -40,6 +50,12 @@ class Orden(Base):
     )
     pago = relationship("Pago", uselist=False, back_populates="orden")
 
+    __table_args__ = (
+        Index("ix_ordenes_mesa_fecha", "mesa_id", "fecha"),
+        # Incluye fecha para que la búsqueda por mesa también resuelva su ORDER BY desde el índice parcial
+        Index("ix_ordenes_abiertas", "mesa_id", "fecha", sqlite_where=text("abierta = 1")),
+    )
+
 
 class OrdenDetalle(Base):
     __tablename__ = "orden_detalle"
@@ -50,18 +66,65 @@ class OrdenDetalle(Base):
     cantidad = Column(Integer, nullable=False)
     entregado = Column(Boolean, default=False)
     entregados = Column(Integer, default=0)
+    # Precio del producto cuando se pidió la línea; editar el catálogo no cambia órdenes existentes
+    precio_unitario = Column(Float, nullable=True)
 
     orden = relationship("Orden", back_populates="detalles")
     producto = relationship("Producto", back_populates="detalles")
 
+    __table_args__ = (
+        Index("uq_orden_detalle_orden_producto", "orden_id", "producto_id", unique=True),
+        Index("ix_orden_detalle_producto", "producto_id"),
+    )
+
 class Pago(Base):
     __tablename__ = "pagos"
 
     id = Column(Integer, primary_key=True, index=True)
+    # unique=True ya crea el índice sobre orden_id
     orden_id = Column(Integer, ForeignKey("ordenes.id"), unique=True, nullable=False)
     metodo = Column(String, nullable=False)  # 'efectivo' | 'tarjeta'
     monto_total = Column(Float, nullable=False)
     propina = Column(Float, default=0.0)
-    fecha = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    fecha = Column(DateTime, default=utcnow)
+
+    orden = relationship("Orden", back_populates="pago")
+
+    __table_args__ = (
+        # Cubre el filtro por fecha y las sumas de /api/finanzas/resumen sin leer la tabla;
+        # también sirve los recorridos por fecha (paginación, exportación), así que no hay otro índice sobre fecha
+        Index("ix_pagos_fecha_montos", "fecha", "metodo", "monto_total", "propina"),
+    )
+
+
+class OrdenEvento(Base):
+    """Historial de cada orden, solo se agrega (ver ``lifecycle.py``).
+
+    Sin FK a ``ordenes``: el historial sobrevive a una orden cancelada (borrada).
+    """
+
+    __tablename__ = "orden_eventos"
+
+    id = Column(Integer, primary_key=True)
+    orden_id = Column(Integer, nullable=False, index=True)
+    # 'creada' | 'items' | 'estado' | 'entrega' | 'cobrada' | 'cancelada'
+    tipo = Column(String, nullable=False)
+    # Estado de la orden después del cambio
+    estado = Column(String, nullable=True)
+    producto_id = Column(Integer, nullable=True)
+    # 'items': unidades agregadas; 'entrega': entregados del ítem después del cambio
+    cantidad = Column(Integer, nullable=True)
+    fecha = Column(DateTime, default=utcnow, nullable=False, index=True)
+
+
+class PagoResumen(Base):
+    """Totales de pagos por hora y método, mantenidos al cobrar (ver ``rollup.py``)."""
+
+    __tablename__ = "pagos_resumen"
 
-    orden = relationship("Orden", back_populates="pago")
\ No newline at end of file
+    dia = Column(String, primary_key=True)  # 'YYYY-MM-DD', misma zona que Pago.fecha
+    hora = Column(Integer, primary_key=True)
+    metodo = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    propina = Column(Float, nullable=False, default=0.0)
+    cantidad = Column(Integer, nullable=False, default=0)
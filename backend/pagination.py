@@ -0,0 +1,43 @@
+"""Paginación por cursor (keyset) sobre ``(fecha, id)``.
+
+El cursor es opaco para el cliente: codifica la ``fecha`` y el ``id`` de la
+última fila de la página. La página siguiente se pide con ``?cursor=`` y
+empieza justo después de esa fila, así que cuesta lo mismo sin importar
+cuántas páginas se hayan recorrido (no hay ``OFFSET``). El cursor de la
+página siguiente viaja en el encabezado ``X-Next-Cursor``; sin encabezado
+no hay más páginas.
+"""
+import base64
+import datetime
+import os
+
+from fastapi import HTTPException, Response
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(fecha: datetime.datetime | None, id_: int) -> str:
+    raw = f"{fecha.isoformat() if fecha else ''}|{id_}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime | None, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        fecha, id_ = raw.rsplit("|", 1)
+        return (datetime.datetime.fromisoformat(fecha) if fecha else None), int(id_)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> list:
+    """Recorta a ``limit`` filas (se piden ``limit + 1``) y publica el cursor si hay más.
+
+    ``key(row)`` devuelve ``(fecha, id)`` de una fila.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -0,0 +1,530 @@
+"""Difusión de eventos de órdenes a los paneles conectados por websocket.
+
+Cada conexión tiene su propia cola acotada y una tarea que le envía los
+mensajes, así un panel lento no retrasa a los demás ni a la respuesta HTTP
+que originó el evento. El payload se serializa una sola vez por difusión.
+Si la cola de un cliente se llena, se le cierra la conexión.
+
+Cada evento lleva un número de secuencia ``seq`` y los últimos se guardan en
+un anillo. Un panel que reconecta con ``?since=<seq>&epoch=<epoch>`` recibe
+solo los eventos que se perdió; si ya salieron del anillo (o el servidor se
+reinició y cambió ``epoch``) recibe un ``snapshot`` con el tablero completo.
+
+Al conectar, el cliente elige tópicos con ``?topics=`` (por ejemplo
+``cocina``, ``caja`` o ``mesa:5``) y solo recibe los eventos que los tocan;
+sin ``topics`` recibe todo. Un índice tópico -> clientes evita recorrer
+todas las conexiones por evento.
+
+Con ``?delta=1`` las actualizaciones de una orden llegan como
+``order_delta`` (solo campos y líneas que cambiaron, con ``version`` y
+``base``). Si el panel detecta un hueco de versiones envía
+``{"op": "full", "id": N}`` y recibe ``order_full`` con la orden completa.
+
+Las actualizaciones de una misma orden se agrupan (``Coalescer``): la
+primera sale de inmediato y las que llegan dentro de ``WS_COALESCE_MS`` se
+combinan en una sola con el último estado. Los eventos terminales
+(``order_paid``, ``order_cancelled``) vacían antes lo pendiente de esa orden.
+
+Un cambio en lote publica un solo ``batch`` con los eventos de cada orden
+afectada en ``events``; un panel suscrito solo a algunas mesas recibe el
+``batch`` con los eventos de sus mesas.
+
+Con ``?encoding=msgpack`` los mensajes llegan como frames binarios
+MessagePack con campos etiquetados por enteros (ver ``wire.py``); cada
+evento se serializa una vez por codificación en uso.
+
+Los eventos pasan por un bus (``bus.py``) antes de llegar a los clientes,
+así con varios workers cada uno entrega también lo que publicaron los demás.
+"""
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import deque
+from typing import Callable
+
+from fastapi import WebSocket
+
+from board import merge_deltas
+from bus import InProcessBus
+from wire import JSON, encode
+
+# Mensajes pendientes por cliente antes de considerarlo lento y desconectarlo
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+# Código de cierre 1013 ("try again later") para los clientes expulsados
+WS_EVICT_CODE = 1013
+# Eventos recientes que se pueden repetir a un cliente que reconecta
+WS_REPLAY_SIZE = int(os.getenv("WS_REPLAY_SIZE", "1024"))
+
+# Ventana para agrupar actualizaciones de la misma orden (0 = sin agrupar)
+WS_COALESCE_MS = int(os.getenv("WS_COALESCE_MS", "50"))
+
+# Suscripción a todos los eventos (la de los clientes que no indican tópicos)
+TOPIC_ALL = "*"
+# Tópicos que necesitan el tablero completo en el snapshot
+BOARD_TOPICS = {TOPIC_ALL, "cocina", "caja"}
+
+
+def event_topics(data: dict) -> tuple[str, ...]:
+    """Tópicos a los que pertenece un evento.
+
+    ``cocina`` recibe todo el ciclo de vida de las órdenes, ``caja`` solo
+    cobros y cancelaciones, ``mesa:N`` lo de las órdenes de esa mesa y
+    ``catalogo`` los cambios de productos.
+    """
+    kind = data.get("type")
+    if kind == "catalog_changed":
+        return ("catalogo",)
+    if kind == "batch":
+        return tuple(dict.fromkeys(t for event in data["events"] for t in event_topics(event)))
+    mesa = data.get("mesa_numero")
+    if mesa is None and isinstance(data.get("order"), dict):
+        mesa = data["order"].get("mesa_numero")
+    topics = ("cocina", "caja") if kind in ("order_paid", "order_cancelled") else ("cocina",)
+    if mesa is not None:
+        topics += (f"mesa:{mesa}",)
+    return topics
+
+
+def parse_topics(raw: str | None) -> frozenset[str]:
+    topics = frozenset(t.strip() for t in (raw or "").split(",") if t.strip())
+    return topics or frozenset({TOPIC_ALL})
+
+
+def _order_id(event: dict) -> int | None:
+    if "orden_id" in event:
+        return event["orden_id"]
+    order = event.get("order")
+    return order.get("id") if isinstance(order, dict) else None
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _as_delta(event: dict) -> dict | None:
+    if event["type"] == "update_order":
+        return event.get("delta")
+    order = event["order"]
+    if order.get("version") is None:
+        return None
+    return {"id": order["id"], "mesa_numero": order.get("mesa_numero"), "version": order["version"],
+            "base": order["version"] - 1, "estado": order["estado"]}
+
+
+def merge_updates(pending: dict, new: dict) -> dict:
+    """Combina dos actualizaciones (``update_order``/``update_status``) de la misma orden en una."""
+    if pending["type"] == "update_status" and new["type"] == "update_status":
+        return new
+    if new["type"] == "update_order":
+        order = new["order"]
+    else:
+        # Estado nuevo sobre la orden completa pendiente
+        order = {**pending["order"], "estado": new["order"]["estado"]}
+        if new["order"].get("version") is not None:
+            order["version"] = new["order"]["version"]
+    merged = {"type": "update_order", "order": order}
+    first, second = _as_delta(pending), _as_delta(new)
+    # Solo si los deltas son consecutivos; si no, los paneles reciben la orden completa
+    if first is not None and second is not None and first["version"] == second["base"]:
+        merged["delta"] = merge_deltas(first, second)
+    return merged
+
+
+class Coalescer:
+    """Agrupa las actualizaciones de cada orden dentro de una ventana de tiempo.
+
+    La primera actualización de una orden se publica de inmediato y abre la
+    ventana; las siguientes se combinan y se publican al cerrarla, con el
+    último estado. Mientras sigan llegando, sale a lo sumo una por ventana.
+    Se usa siempre desde el event loop.
+    """
+
+    UPDATES = ("update_order", "update_status")
+    TERMINAL = ("order_paid", "order_cancelled")
+
+    def __init__(self, publish: Callable[[dict], None], window_ms: int = WS_COALESCE_MS):
+        self._publish = publish
+        self._window = window_ms / 1000.0
+        # id de orden -> [timer de la ventana, actualización pendiente o None]
+        self._open: dict[int, list] = {}
+        self.coalesced = 0
+
+    def submit(self, data: dict) -> None:
+        kind = data.get("type")
+        if self._window <= 0:
+            self._publish(data)
+        elif kind in self.UPDATES:
+            self._update(data["order"]["id"], data)
+        elif kind in self.TERMINAL:
+            # Lo pendiente de la orden sale antes que su cierre
+            self._flush(data["orden_id"])
+            self._publish(data)
+        elif kind == "batch":
+            # El lote lleva el último estado de cada orden; lo pendiente sale antes
+            for event in data["events"]:
+                order_id = _order_id(event)
+                if order_id is not None:
+                    self._flush(order_id)
+            self._publish(data)
+        else:
+            self._publish(data)
+
+    def _update(self, order_id: int, data: dict) -> None:
+        slot = self._open.get(order_id)
+        if slot is None:
+            self._publish(data)
+            self._open[order_id] = [self._schedule(order_id), None]
+            return
+        if slot[1] is not None:
+            self.coalesced += 1
+        slot[1] = data if slot[1] is None else merge_updates(slot[1], data)
+
+    def _schedule(self, order_id: int) -> asyncio.TimerHandle:
+        return asyncio.get_running_loop().call_later(self._window, self._close, order_id)
+
+    def _close(self, order_id: int) -> None:
+        slot = self._open.pop(order_id, None)
+        if slot is None or slot[1] is None:
+            return
+        self._publish(slot[1])
+        # Lo publicado abre otra ventana: en ráfagas largas sale a lo sumo una por ventana
+        self._open[order_id] = [self._schedule(order_id), None]
+
+    def _flush(self, order_id: int) -> None:
+        slot = self._open.pop(order_id, None)
+        if slot is not None:
+            slot[0].cancel()
+            if slot[1] is not None:
+                self._publish(slot[1])
+
+    def flush_all(self) -> None:
+        for order_id in list(self._open):
+            self._flush(order_id)
+
+
+class OutboundEvent:
+    """Evento numerado con sus serializaciones, cada una calculada una sola vez."""
+
+    __slots__ = ("seq", "topics", "full", "delta", "parts", "payloads")
+
+    def __init__(
+        self,
+        seq: int,
+        topics: tuple[str, ...],
+        full: dict,
+        delta: dict | None,
+        parts: list[tuple[str, ...]] | None = None,
+    ):
+        self.seq = seq
+        self.topics = topics
+        self.full = full
+        self.delta = delta
+        # Tópicos de cada evento de un ``batch`` (None en los eventos simples)
+        self.parts = parts
+        # (codificación, es_delta, eventos del lote incluidos o None si todos) -> payload
+        self.payloads: dict[tuple[str, bool, tuple[int, ...] | None], str | bytes] = {}
+
+
+class ClientConnection:
+    __slots__ = ("websocket", "topics", "delta", "encoding", "queue", "task")
+
+    def __init__(
+        self, websocket: WebSocket, topics: frozenset[str], queue_size: int, delta: bool = False, encoding: str = JSON
+    ):
+        self.websocket = websocket
+        self.topics = topics
+        self.delta = delta
+        self.encoding = encoding
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: asyncio.Task | None = None
+
+    def wants(self, topics: tuple[str, ...]) -> bool:
+        return TOPIC_ALL in self.topics or not self.topics.isdisjoint(topics)
+
+
+class OrderWebSocketManager:
+    def __init__(
+        self,
+        snapshot: Callable[[set[int] | None], bytes] | None = None,
+        bus=None,
+        order_lookup: Callable[[int], dict | None] | None = None,
+        queue_size: int = WS_QUEUE_SIZE,
+        replay_size: int = WS_REPLAY_SIZE,
+    ):
+        # ``snapshot(mesas)`` devuelve el tablero serializado (lista JSON de órdenes),
+        # completo con ``None`` o solo el de esas mesas
+        self._snapshot = snapshot
+        # ``order_lookup(id)`` devuelve la orden completa para responder a {"op": "full"}
+        self._order_lookup = order_lookup
+        self.bus = bus or InProcessBus()
+        self._coalescer = Coalescer(self.bus.publish)
+        self._queue_size = queue_size
+        self.active: dict[WebSocket, ClientConnection] = {}
+        self._subscribers: dict[str, set[ClientConnection]] = {}
+        # Identifica esta secuencia: cambia en cada arranque, así un ``since`` viejo no se malinterpreta
+        self.epoch = self.bus.epoch or secrets.token_hex(6)
+        self.seq = 0
+        self._ring: deque[OutboundEvent] = deque(maxlen=replay_size)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Latencias difusión -> envío completado (ms) de las últimas entregas
+        self._latencies: deque[float] = deque(maxlen=2048)
+        self.broadcasts = 0
+        self.deliveries = 0
+        self.evicted = 0
+        self.replays = 0
+        self.snapshots = 0
+        self.bytes_queued: dict[str, int] = {}
+        self.encode_seconds = 0.0
+        self.delta_events = 0
+        self.delta_bytes = 0
+        self.delta_full_bytes = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self.bus.start(self)
+
+    async def stop(self) -> None:
+        self._coalescer.flush_all()
+        self.bus.stop()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        since: int | None = None,
+        epoch: str | None = None,
+        topics: frozenset[str] = frozenset({TOPIC_ALL}),
+        delta: bool = False,
+        encoding: str = JSON,
+    ):
+        """Registra el cliente; con ``since`` le envía primero lo que se perdió.
+
+        ``since=0`` (o un ``epoch`` distinto al actual) pide el tablero completo.
+        Entre calcular el atraso y registrar al cliente no hay ``await``, así
+        ningún evento se pierde ni se duplica.
+        """
+        await websocket.accept()
+        client = ClientConnection(websocket, topics, self._queue_size, delta, encoding)
+        if since is not None:
+            now = time.perf_counter()
+            for payload in self._backlog(client, since, epoch):
+                client.queue.put_nowait((payload, now))
+        client.task = asyncio.create_task(self._sender(client))
+        self.active[websocket] = client
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(client)
+
+    def _backlog(self, client: ClientConnection, since: int, epoch: str | None) -> list[str | bytes]:
+        if epoch == self.epoch and 0 < since <= self.seq:
+            oldest = self._ring[0].seq if self._ring else self.seq + 1
+            missed = self.seq - since
+            if since >= oldest - 1 and missed < self._queue_size:
+                self.replays += 1
+                return [
+                    self._payload(event, client.encoding, client.delta, client.topics)
+                    for event in self._ring
+                    if event.seq > since and client.wants(event.topics)
+                ]
+        return [self._snapshot_payload(client)]
+
+    def _snapshot_payload(self, client: ClientConnection) -> str | bytes:
+        self.snapshots += 1
+        if client.topics & BOARD_TOPICS:
+            mesas = None
+        else:
+            mesas = {int(t[5:]) for t in client.topics if t.startswith("mesa:") and t[5:].isdigit()}
+        orders = self._snapshot(mesas).decode("utf-8") if self._snapshot else "[]"
+        if client.encoding == JSON:
+            # El tablero ya viene serializado (y cacheado); solo se envuelve
+            return '{"type":"snapshot","seq":%d,"epoch":"%s","orders":%s}' % (self.seq, self.epoch, orders)
+        return encode({"type": "snapshot", "seq": self.seq, "epoch": self.epoch, "orders": json.loads(orders)}, client.encoding)
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.active.pop(websocket, None)
+        if client is None:
+            return
+        for topic in client.topics:
+            subs = self._subscribers.get(topic)
+            if subs is not None:
+                subs.discard(client)
+                if not subs:
+                    del self._subscribers[topic]
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def _evict(self, client: ClientConnection) -> None:
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        asyncio.get_running_loop().create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=WS_EVICT_CODE)
+        except Exception:
+            pass
+
+    def deliver(self, data: dict, seq: int | None = None) -> None:
+        """Numera el evento (o usa el ``seq`` global del bus) y lo encola para cada cliente."""
+        self.seq = self.seq + 1 if seq is None else seq
+        delta = data.get("delta")
+        if data.get("type") == "batch":
+            event = self._batch_event(data)
+            if event.delta is not None:
+                self.delta_events += 1
+                self.delta_full_bytes += len(self._payload(event, JSON, False))
+                self.delta_bytes += len(self._payload(event, JSON, True))
+        elif delta is None:
+            event = OutboundEvent(self.seq, event_topics(data), {**data, "seq": self.seq}, None)
+        else:
+            full = {k: v for k, v in data.items() if k != "delta"}
+            event = OutboundEvent(
+                self.seq, event_topics(data), {**full, "seq": self.seq}, {"type": "order_delta", **delta, "seq": self.seq}
+            )
+            # Tamaños JSON completo vs. delta para medir el ahorro
+            self.delta_events += 1
+            self.delta_full_bytes += len(self._payload(event, JSON, False))
+            self.delta_bytes += len(self._payload(event, JSON, True))
+        self._ring.append(event)
+        self.broadcasts += 1
+        queued_at = time.perf_counter()
+        # Solo los clientes suscritos a alguno de los tópicos del evento (o a todos)
+        recipients = set(self._subscribers.get(TOPIC_ALL, ()))
+        for topic in event.topics:
+            recipients.update(self._subscribers.get(topic, ()))
+        for client in recipients:
+            self._push(client, self._payload(event, client.encoding, client.delta, client.topics), queued_at)
+
+    def _batch_event(self, data: dict) -> OutboundEvent:
+        events = data["events"]
+        full = [{k: v for k, v in e.items() if k != "delta"} for e in events]
+        delta = None
+        if any(e.get("delta") is not None for e in events):
+            delta = {
+                "type": "batch",
+                "events": [
+                    {"type": "order_delta", **e["delta"]} if e.get("delta") is not None else f
+                    for e, f in zip(events, full)
+                ],
+                "seq": self.seq,
+            }
+        return OutboundEvent(
+            self.seq,
+            event_topics(data),
+            {"type": "batch", "events": full, "seq": self.seq},
+            delta,
+            [event_topics(e) for e in events],
+        )
+
+    def _payload(
+        self, event: OutboundEvent, encoding: str, delta: bool, topics: frozenset[str] | None = None
+    ) -> str | bytes:
+        """Serialización del evento para una codificación/forma; se calcula una vez y se reutiliza.
+
+        En un ``batch`` con ``topics`` solo se incluyen los eventos que le interesan a esos tópicos.
+        """
+        picked = None
+        if event.parts is not None and topics is not None and TOPIC_ALL not in topics:
+            picked = tuple(i for i, part in enumerate(event.parts) if not topics.isdisjoint(part))
+            if len(picked) == len(event.parts):
+                picked = None
+        key = (encoding, delta and event.delta is not None, picked)
+        payload = event.payloads.get(key)
+        if payload is None:
+            started = time.perf_counter()
+            body = event.delta if key[1] else event.full
+            if picked is not None:
+                body = {**body, "events": [body["events"][i] for i in picked]}
+            payload = encode(body, encoding)
+            self.encode_seconds += time.perf_counter() - started
+            event.payloads[key] = payload
+        return payload
+
+    def _push(self, client: ClientConnection, payload: str | bytes, queued_at: float) -> None:
+        size = len(payload) if isinstance(payload, bytes) else len(payload.encode("utf-8"))
+        self.bytes_queued[client.encoding] = self.bytes_queued.get(client.encoding, 0) + size
+        try:
+            client.queue.put_nowait((payload, queued_at))
+        except asyncio.QueueFull:
+            self._evict(client)
+
+    def handle_message(self, websocket: WebSocket, raw: str) -> None:
+        """Mensajes del cliente; ``{"op": "full", "id": N}`` pide la orden completa tras un hueco de versiones."""
+        if not raw.startswith("{"):
+            return  # hello / ping
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        client = self.active.get(websocket)
+        if client is None or msg.get("op") != "full" or not isinstance(msg.get("id"), int):
+            return
+        order = self._order_lookup(msg["id"]) if self._order_lookup else None
+        # Sin ``seq``: es una respuesta a este cliente, no un evento de la secuencia
+        self._push(client, encode({"type": "order_full", "id": msg["id"], "order": order}, client.encoding), time.perf_counter())
+
+    def deliver_threadsafe(self, data: dict, seq: int) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.deliver, data, seq)
+
+    async def broadcast(self, data: dict):
+        """Publica el evento en el bus; no espera ningún envío."""
+        self._coalescer.submit(data)
+
+    def publish(self, data: dict) -> None:
+        """Como ``broadcast`` pero invocable desde hilos del threadpool (endpoints síncronos)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._coalescer.submit(data)
+        else:
+            loop.call_soon_threadsafe(self._coalescer.submit, data)
+
+    async def _sender(self, client: ClientConnection) -> None:
+        try:
+            while True:
+                payload, queued_at = await client.queue.get()
+                if isinstance(payload, bytes):
+                    await client.websocket.send_bytes(payload)
+                else:
+                    await client.websocket.send_text(payload)
+                self.deliveries += 1
+                self._latencies.append((time.perf_counter() - queued_at) * 1000.0)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # On error, drop connection
+            self.disconnect(client.websocket)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "clientes": len(self.active),
+            "topicos": {topic: len(subs) for topic, subs in self._subscribers.items()},
+            "seq": self.seq,
+            "epoch": self.epoch,
+            "difusiones": self.broadcasts,
+            "agrupados": self._coalescer.coalesced,
+            "entregas": self.deliveries,
+            "expulsados": self.evicted,
+            "repeticiones": self.replays,
+            "bytes_encolados": self.bytes_queued,
+            "codificacion_us_prom": round(self.encode_seconds / self.broadcasts * 1e6, 1) if self.broadcasts else 0.0,
+            "eventos_delta": self.delta_events,
+            "bytes_delta_prom": round(self.delta_bytes / self.delta_events, 1) if self.delta_events else 0.0,
+            "bytes_completo_prom": round(self.delta_full_bytes / self.delta_events, 1) if self.delta_events else 0.0,
+            "snapshots": self.snapshots,
+            "cola_mayor": max((c.queue.qsize() for c in self.active.values()), default=0),
+            "latencia_p50_ms": round(_percentile(latencies, 0.50), 3),
+            "latencia_p99_ms": round(_percentile(latencies, 0.99), 3),
+            "latencia_max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        }
@@ -0,0 +1,116 @@
+"""Resumen incremental de pagos por hora y método (tabla ``pagos_resumen``).
+
+``registrar_pago`` suma cada pago nuevo a su hora en la misma transacción
+que lo inserta, así el resumen nunca queda atrás de ``pagos``. Un rango de
+``/api/finanzas/resumen`` se parte en las horas completas que cubre (se
+leen del resumen: a lo sumo 24 filas por día y método, sin importar cuántos
+pagos hubo) y los bordes parciales, que se suman desde ``pagos``.
+
+Para reconstruirlo desde ``pagos`` (p. ej. tras una carga manual de datos),
+desde backend/:
+    python rollup.py rebuild
+"""
+import argparse
+import datetime
+
+from sqlalchemy import Integer, cast, delete, func, insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Pago, PagoResumen
+
+HORA = datetime.timedelta(hours=1)
+# Resolución de Pago.fecha: ``hasta`` es inclusivo, una hora está completa si termina antes de hasta + 1 µs
+RESOLUCION = datetime.timedelta(microseconds=1)
+
+
+def bucket(fecha: datetime.datetime) -> tuple[str, int]:
+    return fecha.strftime("%Y-%m-%d"), fecha.hour
+
+
+def _floor_hour(fecha: datetime.datetime) -> datetime.datetime:
+    return fecha.replace(minute=0, second=0, microsecond=0)
+
+
+def horas_completas(
+    desde: datetime.datetime | None, hasta: datetime.datetime | None
+) -> tuple[datetime.datetime | None, datetime.datetime | None] | None:
+    """Horas completas dentro de ``[desde, hasta]`` como ``[inicio, fin)``; ``None`` en un extremo es abierto.
+
+    Devuelve ``None`` si el rango no cubre ninguna hora completa.
+    """
+    inicio = None
+    if desde is not None:
+        inicio = _floor_hour(desde)
+        if inicio != desde:
+            inicio += HORA
+    fin = None if hasta is None else _floor_hour(hasta + RESOLUCION)
+    if inicio is not None and fin is not None and inicio >= fin:
+        return None
+    return inicio, fin
+
+
+def _upsert(dialect: str):
+    if dialect == "postgresql":
+        return postgresql.insert(PagoResumen)
+    return sqlite.insert(PagoResumen)
+
+
+async def registrar_pago(db: AsyncSession, pago: Pago) -> None:
+    """Suma ``pago`` (ya con ``fecha`` tras el flush) a su hora; va en la transacción del cobro."""
+    dia, hora = bucket(pago.fecha)
+    stmt = _upsert(db.get_bind().dialect.name).values(
+        dia=dia, hora=hora, metodo=pago.metodo, total=pago.monto_total, propina=pago.propina or 0.0, cantidad=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PagoResumen.dia, PagoResumen.hora, PagoResumen.metodo],
+        set_={
+            "total": PagoResumen.total + stmt.excluded.total,
+            "propina": PagoResumen.propina + stmt.excluded.propina,
+            "cantidad": PagoResumen.cantidad + stmt.excluded.cantidad,
+        },
+    )
+    await db.execute(stmt)
+
+
+def rebuild(conn: Connection) -> int:
+    """Recalcula ``pagos_resumen`` completo desde ``pagos``; devuelve las filas escritas."""
+    if conn.dialect.name == "sqlite":
+        dia, hora = func.strftime("%Y-%m-%d", Pago.fecha), cast(func.strftime("%H", Pago.fecha), Integer)
+    else:
+        dia, hora = func.to_char(Pago.fecha, "YYYY-MM-DD"), cast(func.extract("hour", Pago.fecha), Integer)
+    conn.execute(delete(PagoResumen))
+    source = select(
+        dia, hora, Pago.metodo, func.sum(Pago.monto_total), func.coalesce(func.sum(Pago.propina), 0.0), func.count(Pago.id)
+    ).group_by(dia, hora, Pago.metodo)
+    conn.execute(
+        insert(PagoResumen).from_select(["dia", "hora", "metodo", "total", "propina", "cantidad"], source)
+    )
+    return conn.execute(select(func.count()).select_from(PagoResumen)).scalar_one()
+
+
+def condicion_horas(inicio: datetime.datetime | None, fin: datetime.datetime | None) -> list:
+    """Filas del resumen para las horas ``[inicio, fin)``."""
+    condiciones = []
+    if inicio is not None:
+        condiciones.append(tuple_(PagoResumen.dia, PagoResumen.hora) >= bucket(inicio))
+    if fin is not None:
+        condiciones.append(tuple_(PagoResumen.dia, PagoResumen.hora) < bucket(fin))
+    return condiciones
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resumen de pagos por hora y método")
+    parser.add_argument("accion", choices=["rebuild"])
+    parser.parse_args()
+
+    from database import engine, for_writes
+
+    with for_writes(engine).begin() as conn:
+        filas = rebuild(conn)
+    print(f"pagos_resumen reconstruido: {filas} filas")
+
+
+if __name__ == "__main__":
+    main()
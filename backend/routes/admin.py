@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 import io
@@ -8,9 +10,15 @@ import qrcode
 import os
 import json
 import datetime
-
-from database import get_db
-from models import Mesa, Orden, OrdenDetalle, Producto, Pago
+import anyio
+
+from board import board, BoardOrder, order_event
+from catalog import catalog
+from database import get_read_db
+from lifecycle import LATENCY_RETENTION_H, latency_tracker, registrar
+from models import Mesa, Orden, OrdenDetalle
+from routes.ordenes import open_orders, open_order_for_mesa_select, derive_estado, update_estado
+from writer import writer
 from qrcode.image.styledpil import StyledPilImage
 from qrcode.image.styles.moduledrawers import SquareModuleDrawer, RoundedModuleDrawer, CircleModuleDrawer, GappedSquareModuleDrawer
 from qrcode.image.styles.colormasks import SolidFillColorMask
@@ -33,7 +41,7 @@ class QrConfigOut(BaseModel):
 
 
 @router.get("/qr/config", response_model=QrConfigOut)
-def get_qr_config(request: Request, db: Session = Depends(get_db)):
+def get_qr_config(request: Request, db: Session = Depends(get_read_db)):
     base = _recommended_base_url(request)
     try:
         total = db.query(Mesa).count()
@@ -267,6 +275,98 @@ def generar_qr_zip(req: QrGenRequest):
     return StreamingResponse(zip_buf, media_type="application/zip", headers=headers)
 
 
+class BoardCheckOut(BaseModel):
+    ok: bool
+    diferencias: list[str]
+    reconstruido: bool = False
+
+
+@router.get("/tablero/verificar", response_model=BoardCheckOut)
+def verificar_tablero(reconstruir: bool = False, db: Session = Depends(get_read_db)):
+    """Verifica el tablero en memoria contra la BD; opcionalmente lo reconstruye."""
+    orders = open_orders(db)
+    diffs = board.check(orders)
+    if diffs and reconstruir:
+        board.load(orders)
+        return BoardCheckOut(ok=False, diferencias=diffs, reconstruido=True)
+    return BoardCheckOut(ok=not diffs, diferencias=diffs)
+
+
+class WriterStatsOut(BaseModel):
+    pendientes: int
+    lotes: int
+    operaciones: int
+    lote_mayor: int
+
+
+@router.get("/writer/stats", response_model=WriterStatsOut)
+def estadisticas_escritor():
+    """Cola del escritor único: operaciones pendientes y tamaño de los lotes aplicados."""
+    return WriterStatsOut(**writer.stats())
+
+
+class WsStatsOut(BaseModel):
+    clientes: int
+    topicos: dict[str, int]
+    seq: int
+    epoch: str
+    difusiones: int
+    agrupados: int
+    entregas: int
+    expulsados: int
+    repeticiones: int
+    bytes_encolados: dict[str, int]
+    codificacion_us_prom: float
+    eventos_delta: int
+    bytes_delta_prom: float
+    bytes_completo_prom: float
+    snapshots: int
+    cola_mayor: int
+    latencia_p50_ms: float
+    latencia_p99_ms: float
+    latencia_max_ms: float
+
+
+@router.get("/ws/stats", response_model=WsStatsOut)
+def estadisticas_ws(request: Request):
+    """Clientes conectados, expulsiones por cola llena y latencia difusión -> entrega."""
+    return WsStatsOut(**request.app.state.order_manager.stats())
+
+
+class PercentilesOut(BaseModel):
+    muestras: int
+    p50: float | None
+    p90: float | None
+    p99: float | None
+
+
+class ProductoLatenciaOut(PercentilesOut):
+    producto_id: int
+    nombre: str
+
+
+class CocinaLatenciasOut(BaseModel):
+    minutos: int
+    # Segundos desde que la orden tiene algo pendiente hasta que queda entregada
+    entrega: PercentilesOut
+    # Segundos por unidad desde que se pidió hasta que se entregó; muestras = unidades
+    productos: list[ProductoLatenciaOut]
+    en_espera: int
+    espera_max: float | None
+
+
+@router.get("/cocina/latencias", response_model=CocinaLatenciasOut)
+def latencias_cocina(minutos: int = Query(60, ge=1, le=LATENCY_RETENTION_H * 60), db: Session = Depends(get_read_db)):
+    """p50/p90/p99 de orden -> entrega y de preparación por producto en los últimos ``minutos``."""
+    data = latency_tracker.latencias(db, minutos)
+    productos = []
+    for producto_id, p in data["productos"].items():
+        prod = catalog.get(db, producto_id)
+        productos.append(ProductoLatenciaOut(producto_id=producto_id, nombre=prod.nombre if prod else "", **p))
+    productos.sort(key=lambda p: (p.p90 or 0.0), reverse=True)
+    return CocinaLatenciasOut(**{**data, "productos": productos})
+
+
 class VoiceCommandIn(BaseModel):
     text: str
 
@@ -285,13 +385,11 @@ class VoiceCommandOut(BaseModel):
     operations: list[VoiceOperation]
 
 
-def _active_orders(db: Session) -> list[Orden]:
-    orders = db.query(Orden).order_by(Orden.fecha.asc()).all()
-    visibles = [o for o in orders if db.query(Pago).filter(Pago.orden_id == o.id).first() is None]
-    return visibles
+def _active_orders() -> list[BoardOrder]:
+    return board.orders()
 
 
-def _serialize_orders_for_ai(orders: list[Orden]) -> list[dict]:
+def _serialize_orders_for_ai(orders: list[BoardOrder]) -> list[dict]:
     now = datetime.datetime.utcnow()
     data: list[dict] = []
     for o in orders:
@@ -301,26 +399,23 @@ def _serialize_orders_for_ai(orders: list[Orden]) -> list[dict]:
                 fecha = fecha.astimezone(datetime.timezone.utc).replace(tzinfo=None)
         else:
             continue
-        mesa = o.mesa.numero if o.mesa else None
         age_min = int((now - fecha).total_seconds() // 60)
         items: list[dict] = []
-        for d in o.detalles:
-            nombre = d.producto.nombre if d.producto else ""
-            entregados = int(getattr(d, "entregados", 0))
-            faltan = max(0, d.cantidad - entregados)
+        for it in o.items:
+            faltan = max(0, it.cantidad - it.entregados)
             items.append(
                 {
-                    "producto_id": d.producto_id,
-                    "nombre": nombre,
-                    "cantidad": d.cantidad,
-                    "entregados": entregados,
+                    "producto_id": it.producto_id,
+                    "nombre": it.nombre,
+                    "cantidad": it.cantidad,
+                    "entregados": it.entregados,
                     "faltan": faltan,
                 }
             )
         data.append(
             {
                 "orden_id": o.id,
-                "mesa_numero": mesa,
+                "mesa_numero": o.mesa_numero,
                 "estado": o.estado,
                 "edad_minutos": age_min,
                 "items": items,
@@ -422,23 +517,58 @@ def _build_status_summary(orders_for_ai: list[dict]) -> str:
     )
 
 
-def _find_open_order_for_mesa(db: Session, mesa_numero: int) -> Orden | None:
-    mesa = db.query(Mesa).filter(Mesa.numero == mesa_numero).first()
-    if not mesa:
+async def _find_open_order_for_mesa(db: AsyncSession, mesa_numero: int) -> Orden | None:
+    mesa_id = select(Mesa.id).where(Mesa.numero == mesa_numero).scalar_subquery()
+    return await db.scalar(open_order_for_mesa_select(mesa_id))
+
+
+async def _voice_set_estado(db: AsyncSession, order_id: int, estado: str) -> BoardOrder | None:
+    """Operación del escritor; ``None`` si la orden no existe (la voz ignora la operación)."""
+    try:
+        return await update_estado(db, order_id, estado)
+    except HTTPException:
         return None
-    orders = (
-        db.query(Orden)
-        .filter(Orden.mesa_id == mesa.id)
-        .order_by(Orden.fecha.desc())
-        .all()
-    )
-    for o in orders:
-        if db.query(Pago).filter(Pago.orden_id == o.id).first() is None:
-            return o
-    return None
 
 
-def _apply_voice_operations(ops: list[dict], request: Request, db: Session) -> list[VoiceOperation]:
+async def _voice_incrementar(db: AsyncSession, mesa_numero: int, producto_nombre: str, cantidad: int) -> BoardOrder | None:
+    """Operación del escritor: suma unidades entregadas al primer producto cuyo nombre coincide."""
+    order = await _find_open_order_for_mesa(db, mesa_numero)
+    if not order:
+        return None
+    productos = await catalog.aget_many(db, [d.producto_id for d in order.detalles])
+    producto_nombre_l = producto_nombre.lower()
+    match_det: OrdenDetalle | None = None
+    for d in order.detalles:
+        prod = productos.get(d.producto_id)
+        nombre = prod.nombre if prod else ""
+        if producto_nombre_l in nombre.lower():
+            match_det = d
+            break
+    if not match_det:
+        return None
+    prev_entregados = int(getattr(match_det, "entregados", 0))
+    nuevo = max(0, min(prev_entregados + cantidad, match_det.cantidad))
+    match_det.entregados = nuevo
+    match_det.entregado = nuevo >= match_det.cantidad
+    order.estado = derive_estado(order)
+    registrar(db, order.id, "entrega", order.estado, match_det.producto_id, nuevo)
+    return BoardOrder.from_orm(order)
+
+
+async def _voice_cancelar(db: AsyncSession, mesa_numero: int) -> int | None:
+    """Operación del escritor: borra la orden abierta de la mesa y devuelve su id."""
+    order = await _find_open_order_for_mesa(db, mesa_numero)
+    if not order:
+        return None
+    oid = order.id
+    await db.delete(order)
+    registrar(db, oid, "cancelada", order.estado)
+    return oid
+
+
+async def _apply_voice_operations(ops: list[dict], request: Request) -> list[VoiceOperation]:
+    """Aplica las operaciones en el event loop: pasan por el escritor y el tablero se actualiza en su orden."""
+    manager = request.app.state.order_manager
     applied: list[VoiceOperation] = []
     for op in ops:
         t = str(op.get("type") or "").lower()
@@ -448,23 +578,26 @@ def _apply_voice_operations(ops: list[dict], request: Request, db: Session) -> l
             order_id = op.get("order_id")
             estado = op.get("estado")
             if isinstance(order_id, int) and isinstance(estado, str):
-                order = db.get(Orden, order_id)
-                if not order:
+                entry = await writer.submit(lambda db: _voice_set_estado(db, order_id, estado))
+                if entry is None:
                     continue
-                order.estado = estado
-                db.commit()
-                db.refresh(order)
-                try:
-                    request.app.state.order_manager.broadcast(
-                        {"type": "update_status", "order": {"id": order.id, "estado": order.estado}}
-                    )
-                except Exception:
-                    pass
+                entry = board.upsert(entry)
+                await manager.broadcast(
+                    {
+                        "type": "update_status",
+                        "order": {
+                            "id": entry.id,
+                            "mesa_numero": entry.mesa_numero,
+                            "estado": entry.estado,
+                            "version": entry.version,
+                        },
+                    }
+                )
                 applied.append(
                     VoiceOperation(
                         type="set_order_state_by_id",
-                        order_id=order.id,
-                        estado=order.estado,
+                        order_id=entry.id,
+                        estado=entry.estado,
                     )
                 )
         elif t == "increment_items_ready_by_name":
@@ -473,62 +606,15 @@ def _apply_voice_operations(ops: list[dict], request: Request, db: Session) -> l
             cantidad = op.get("cantidad")
             if not (isinstance(mesa_numero, int) and isinstance(producto_nombre, str) and isinstance(cantidad, int)):
                 continue
-            order = _find_open_order_for_mesa(db, mesa_numero)
-            if not order:
-                continue
-            db.refresh(order)
-            match_det: OrdenDetalle | None = None
-            producto_nombre_l = producto_nombre.lower()
-            for d in order.detalles:
-                nombre = d.producto.nombre if d.producto else ""
-                if producto_nombre_l in nombre.lower():
-                    match_det = d
-                    break
-            if not match_det:
+            entry = await writer.submit(lambda db: _voice_incrementar(db, mesa_numero, producto_nombre, cantidad))
+            if entry is None:
                 continue
-            prev_entregados = int(getattr(match_det, "entregados", 0))
-            nuevo = max(0, min(prev_entregados + cantidad, match_det.cantidad))
-            match_det.entregados = nuevo
-            match_det.entregado = nuevo >= match_det.cantidad
-            all_delivered = all(int(getattr(d, "entregados", 0)) >= d.cantidad for d in order.detalles)
-            any_delivered = any(int(getattr(d, "entregados", 0)) > 0 for d in order.detalles)
-            order.estado = "entregado" if all_delivered else ("en_proceso" if any_delivered else "pendiente")
-            db.commit()
-            db.refresh(order)
-            try:
-                items = []
-                for d in order.detalles:
-                    prod = db.get(Producto, d.producto_id)
-                    entregados = int(getattr(d, "entregados", 0))
-                    items.append(
-                        {
-                            "producto_id": d.producto_id,
-                            "nombre": prod.nombre if prod else "",
-                            "precio": float(prod.precio) if prod else 0.0,
-                            "cantidad": d.cantidad,
-                            "entregado": entregados >= d.cantidad,
-                            "entregados": entregados,
-                        }
-                    )
-                request.app.state.order_manager.broadcast(
-                    {
-                        "type": "update_order",
-                        "order": {
-                            "id": order.id,
-                            "mesa_numero": order.mesa.numero if order.mesa else None,
-                            "fecha": order.fecha.isoformat(),
-                            "estado": order.estado,
-                            "items": items,
-                            "pagado": False,
-                        },
-                    }
-                )
-            except Exception:
-                pass
+            entry, delta = board.update(entry)
+            await manager.broadcast(order_event("update_order", entry, delta))
             applied.append(
                 VoiceOperation(
                     type="increment_items_ready_by_name",
-                    order_id=order.id,
+                    order_id=entry.id,
                     mesa_numero=mesa_numero,
                     producto_nombre=producto_nombre,
                     cantidad=cantidad,
@@ -538,16 +624,11 @@ def _apply_voice_operations(ops: list[dict], request: Request, db: Session) -> l
             mesa_numero = op.get("mesa_numero")
             if not isinstance(mesa_numero, int):
                 continue
-            order = _find_open_order_for_mesa(db, mesa_numero)
-            if not order:
+            oid = await writer.submit(lambda db: _voice_cancelar(db, mesa_numero))
+            if oid is None:
                 continue
-            oid = order.id
-            db.delete(order)
-            db.commit()
-            try:
-                request.app.state.order_manager.broadcast({"type": "order_cancelled", "orden_id": oid})
-            except Exception:
-                pass
+            board.remove(oid)
+            await manager.broadcast({"type": "order_cancelled", "orden_id": oid, "mesa_numero": mesa_numero})
             applied.append(
                 VoiceOperation(
                     type="cancel_order_by_mesa",
@@ -559,9 +640,9 @@ def _apply_voice_operations(ops: list[dict], request: Request, db: Session) -> l
 
 
 @router.post("/voice/command", response_model=VoiceCommandOut)
-def handle_voice_command(payload: VoiceCommandIn, request: Request, db: Session = Depends(get_db)):
+def handle_voice_command(payload: VoiceCommandIn, request: Request):
     text = payload.text.strip()
-    orders = _active_orders(db)
+    orders = _active_orders()
     orders_for_ai = _serialize_orders_for_ai(orders)
     low = text.lower()
     if any(
@@ -639,7 +720,8 @@ def handle_voice_command(payload: VoiceCommandIn, request: Request, db: Session
     ops = parsed.get("operations") or []
     if not isinstance(ops, list):
         ops = []
-    applied = _apply_voice_operations(ops, request, db)
+    # El endpoint corre en el threadpool (la llamada al modelo bloquea); las mutaciones van al event loop
+    applied = anyio.from_thread.run(_apply_voice_operations, ops, request)
     spoken = parsed.get("spoken_response")
     if not isinstance(spoken, str) or not spoken.strip():
         if not orders:
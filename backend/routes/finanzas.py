@@ -1,16 +1,26 @@
 import os
+import io
+import csv
 import hmac
+import json
 import base64
+import itertools
 import time
 import datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import Date, Integer, String, cast, extract, func, select, tuple_
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
-from database import get_db
-from models import Pago
+from database import get_read_db, read_engine
+from models import Mesa, Orden, OrdenDetalle, Pago, PagoResumen, Producto
+from rollup import condicion_horas, horas_completas
+from analytics import ANALYTICS_TOP, analytics_cache, desde_por_defecto
+from pagination import PAGE_SIZE, PAGE_SIZE_MAX, decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/api/finanzas", tags=["finanzas"]) 
 
@@ -18,6 +28,8 @@ router = APIRouter(prefix="/api/finanzas", tags=["finanzas"])
 FIN_USER = os.getenv("FINANZAS_USER", "admin")
 FIN_PASS = os.getenv("FINANZAS_PASS", "admin123")
 SECRET = os.getenv("FINANZAS_SECRET", "supersecret-finanzas")
+# Filas que se leen del cursor (y se envían) por bloque en /export
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "2000"))
 TOKEN_NAME = "finanzas_token"
 TOKEN_TTL = 60 * 60 * 8  # 8 horas
 
@@ -102,48 +114,320 @@ class PagoOut(BaseModel):
 
 
 @router.get("/pagos", response_model=List[PagoOut])
-def listar_pagos(request: Request, db: Session = Depends(get_db), user: str = Depends(require_auth), 
-                 desde: Optional[str] = None, hasta: Optional[str] = None):
-    q = db.query(Pago)
-    if desde:
-        try:
-            d = datetime.datetime.fromisoformat(desde)
-            q = q.filter(Pago.fecha >= d)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Formato 'desde' inválido (ISO)")
-    if hasta:
-        try:
-            h = datetime.datetime.fromisoformat(hasta)
-            q = q.filter(Pago.fecha <= h)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Formato 'hasta' inválido (ISO)")
-    q = q.order_by(Pago.fecha.desc())
-    return q.all()
+def listar_pagos(request: Request, response: Response, db: Session = Depends(get_read_db),
+                 user: str = Depends(require_auth), desde: Optional[str] = None, hasta: Optional[str] = None,
+                 limit: int = Query(default=PAGE_SIZE, ge=1, le=PAGE_SIZE_MAX), cursor: Optional[str] = None):
+    """Pagos del más reciente al más antiguo, de a ``limit``; la página siguiente con ``X-Next-Cursor``."""
+    q = db.query(Pago).filter(*filtro_fechas(desde, hasta))
+    if cursor:
+        fecha, pago_id = decode_cursor(cursor)
+        # Comparación por fila: SQLite la resuelve como rango sobre ix_pagos_fecha_montos; los empates de fecha se ordenan por id
+        q = q.filter(tuple_(Pago.fecha, Pago.id) < (fecha, pago_id))
+    q = q.order_by(Pago.fecha.desc(), Pago.id.desc()).limit(limit + 1)
+    return set_next_cursor(response, q.all(), limit, lambda p: (p.fecha, p.id))
+
+
+class GrupoOut(BaseModel):
+    dia: Optional[str] = None
+    hora: Optional[int] = None
+    # 0 = domingo ... 6 = sábado
+    dia_semana: Optional[int] = None
+    metodo: Optional[str] = None
+    total: float
+    propina: float
+    cantidad: int
 
 
 class ResumenOut(BaseModel):
     total: float
     propina: float
     cantidad: int
+    grupos: Optional[List[GrupoOut]] = None
+
+
+AGRUPACIONES = ("dia", "hora", "dia_semana", "metodo")
+
+
+def parse_fecha(valor: Optional[str], campo: str) -> Optional[datetime.datetime]:
+    if not valor:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(valor)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Formato '{campo}' inválido (ISO)")
+
+
+def filtro_fechas(desde: Optional[str], hasta: Optional[str]) -> list:
+    """Condiciones sobre ``Pago.fecha`` para ``desde``/``hasta`` (ISO, ambos inclusivos)."""
+    condiciones = []
+    d, h = parse_fecha(desde, "desde"), parse_fecha(hasta, "hasta")
+    if d is not None:
+        condiciones.append(Pago.fecha >= d)
+    if h is not None:
+        condiciones.append(Pago.fecha <= h)
+    return condiciones
+
+
+def parse_agrupar(agrupar: Optional[str]) -> list[str]:
+    dims = [d.strip() for d in (agrupar or "").split(",") if d.strip()]
+    invalid = [d for d in dims if d not in AGRUPACIONES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Agrupación inválida: {', '.join(invalid)} (use {', '.join(AGRUPACIONES)})")
+    return list(dict.fromkeys(dims))
+
+
+def _dimension_resumen(nombre: str, sqlite: bool):
+    if nombre == "dia_semana":
+        if sqlite:
+            return cast(func.strftime("%w", PagoResumen.dia), Integer)
+        return cast(extract("dow", cast(PagoResumen.dia, Date)), Integer)
+    return getattr(PagoResumen, nombre)
+
+
+def _acumular(grupos: dict, filas, n_dims: int) -> None:
+    for row in filas:
+        acc = grupos.setdefault(tuple(row[:n_dims]), [0.0, 0.0, 0])
+        acc[0] += row[-3] or 0.0
+        acc[1] += row[-2] or 0.0
+        acc[2] += row[-1] or 0
+
+
+def _dimension(nombre: str, sqlite: bool):
+    if nombre == "metodo":
+        return Pago.metodo
+    if sqlite:
+        return {
+            "dia": func.strftime("%Y-%m-%d", Pago.fecha),
+            "hora": cast(func.strftime("%H", Pago.fecha), Integer),
+            "dia_semana": cast(func.strftime("%w", Pago.fecha), Integer),
+        }[nombre]
+    return {
+        "dia": cast(cast(Pago.fecha, Date), String),
+        "hora": cast(extract("hour", Pago.fecha), Integer),
+        "dia_semana": cast(extract("dow", Pago.fecha), Integer),
+    }[nombre]
 
 
 @router.get("/resumen", response_model=ResumenOut)
-def resumen_finanzas(db: Session = Depends(get_db), user: str = Depends(require_auth), 
-                     desde: Optional[str] = None, hasta: Optional[str] = None):
-    q = db.query(Pago)
-    if desde:
-        try:
-            d = datetime.datetime.fromisoformat(desde)
-            q = q.filter(Pago.fecha >= d)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Formato 'desde' inválido (ISO)")
-    if hasta:
-        try:
-            h = datetime.datetime.fromisoformat(hasta)
-            q = q.filter(Pago.fecha <= h)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Formato 'hasta' inválido (ISO)")
-    pagos = q.all()
-    total = sum(float(p.monto_total) for p in pagos)
-    propina = sum(float(p.propina or 0.0) for p in pagos)
-    return ResumenOut(total=total, propina=propina, cantidad=len(pagos))
\ No newline at end of file
+def resumen_finanzas(db: Session = Depends(get_read_db), user: str = Depends(require_auth), 
+                     desde: Optional[str] = None, hasta: Optional[str] = None, agrupar: Optional[str] = None):
+    """Totales del rango; con ``agrupar`` (``dia``, ``hora``, ``dia_semana``, ``metodo``,
+    separados por coma) también el desglose por esas dimensiones.
+
+    Las horas completas del rango salen de ``pagos_resumen`` (``rollup.py``) y
+    solo los bordes parciales se suman desde ``pagos``, sobre el índice
+    cubriente ``ix_pagos_fecha_montos``.
+    """
+    dims = parse_agrupar(agrupar)
+    d, h = parse_fecha(desde, "desde"), parse_fecha(hasta, "hasta")
+    sqlite = db.get_bind().dialect.name == "sqlite"
+    grupos: dict[tuple, list] = {}
+
+    def crudo(*condiciones) -> None:
+        columnas = [_dimension(n, sqlite).label(n) for n in dims]
+        stmt = select(
+            *columnas,
+            func.sum(Pago.monto_total),
+            func.sum(Pago.propina),
+            func.count(Pago.id),
+        ).where(*condiciones)
+        if columnas:
+            stmt = stmt.group_by(*columnas)
+        _acumular(grupos, db.execute(stmt), len(dims))
+
+    horas = horas_completas(d, h)
+    if horas is None:
+        crudo(*filtro_fechas(desde, hasta))
+    else:
+        inicio, fin = horas
+        columnas = [_dimension_resumen(n, sqlite).label(n) for n in dims]
+        stmt = select(
+            *columnas,
+            func.sum(PagoResumen.total),
+            func.sum(PagoResumen.propina),
+            func.sum(PagoResumen.cantidad),
+        ).where(*condicion_horas(inicio, fin))
+        if columnas:
+            stmt = stmt.group_by(*columnas)
+        _acumular(grupos, db.execute(stmt), len(dims))
+        # Bordes: de ``desde`` a la primera hora completa y de la última a ``hasta``. Solo las
+        # dos cotas de cada borde: con las del rango completo SQLite puede recorrer todo el rango
+        if inicio is not None and d is not None and d < inicio:
+            crudo(Pago.fecha >= d, Pago.fecha < inicio)
+        if fin is not None and h is not None:
+            crudo(Pago.fecha >= fin, Pago.fecha <= h)
+
+    total = round(sum(acc[0] for acc in grupos.values()), 2)
+    propina = round(sum(acc[1] for acc in grupos.values()), 2)
+    cantidad = sum(acc[2] for acc in grupos.values())
+    if not dims:
+        return ResumenOut(total=total, propina=propina, cantidad=cantidad)
+    return ResumenOut(
+        total=total,
+        propina=propina,
+        cantidad=cantidad,
+        grupos=[
+            GrupoOut(**dict(zip(dims, key)), total=round(acc[0], 2), propina=round(acc[1], 2), cantidad=acc[2])
+            for key, acc in sorted(grupos.items())
+            if acc[2]
+        ],
+    )
+
+
+FORMATOS_EXPORT = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+LINEA_COLUMNAS = ("producto_id", "producto", "cantidad", "entregados", "precio")
+
+
+def export_select(condiciones: list, lineas: bool):
+    """Pagos con su orden y mesa (y con ``lineas``, una fila por línea de la orden), por ``(fecha, id)``.
+
+    El orden es el de ``ix_pagos_fecha_montos``: SQLite recorre el índice y solo
+    ordena por id los pagos de una misma fecha, sin ordenar el resultado completo.
+    """
+    stmt = (
+        select(
+            Pago.id.label("pago_id"),
+            Pago.orden_id,
+            Mesa.numero.label("mesa_numero"),
+            Pago.metodo,
+            Pago.monto_total,
+            Pago.propina,
+            Pago.fecha,
+            Orden.fecha.label("orden_fecha"),
+        )
+        .join(Orden, Orden.id == Pago.orden_id)
+        .join(Mesa, Mesa.id == Orden.mesa_id)
+        .where(*condiciones)
+        .order_by(Pago.fecha, Pago.id)
+    )
+    if lineas:
+        stmt = (
+            stmt.add_columns(
+                OrdenDetalle.producto_id,
+                Producto.nombre.label("producto"),
+                OrdenDetalle.cantidad,
+                OrdenDetalle.entregados,
+                # Precio con que se pidió, no el del catálogo actual
+                OrdenDetalle.precio_unitario.label("precio"),
+            )
+            .outerjoin(OrdenDetalle, OrdenDetalle.orden_id == Pago.orden_id)
+            .outerjoin(Producto, Producto.id == OrdenDetalle.producto_id)
+        )
+    return stmt
+
+
+def _bloques(result, chunk: int):
+    # Un primer bloque chico para que la descarga empiece de inmediato; después de a ``chunk``
+    return itertools.chain([result.fetchmany(min(chunk, 100))], result.partitions())
+
+
+def _valor(v):
+    return v.isoformat() if isinstance(v, datetime.datetime) else v
+
+
+def exportar(engine: Engine, stmt, formato: str, lineas: bool, chunk: int = EXPORT_CHUNK) -> Iterator[str]:
+    """Genera el export por bloques de ``chunk`` filas; nunca tiene más de un bloque en memoria.
+
+    La conexión se abre dentro del generador: vive mientras dura la
+    respuesta y se cierra aunque el cliente corte la descarga.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk).execute(stmt)
+        columnas = list(result.keys())
+        if formato == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columnas)
+            # El encabezado sale antes de leer la primera fila
+            yield buf.getvalue()
+            for filas in _bloques(result, chunk):
+                buf.seek(0)
+                buf.truncate()
+                writer.writerows([_valor(v) for v in fila] for fila in filas)
+                yield buf.getvalue()
+            return
+
+        # NDJSON: un objeto por pago; con ``lineas`` sus líneas van anidadas en ``items``
+        n_pago = len(columnas) - len(LINEA_COLUMNAS) if lineas else len(columnas)
+        actual: dict | None = None
+        for filas in _bloques(result, chunk):
+            out = []
+            for fila in filas:
+                if actual is None or not lineas or actual["pago_id"] != fila[0]:
+                    if actual is not None:
+                        out.append(json.dumps(actual, ensure_ascii=False))
+                    actual = {k: _valor(v) for k, v in zip(columnas[:n_pago], fila[:n_pago])}
+                    if lineas:
+                        actual["items"] = []
+                if lineas and fila[n_pago] is not None:
+                    actual["items"].append(dict(zip(LINEA_COLUMNAS, fila[n_pago:])))
+            if out:
+                yield "\n".join(out) + "\n"
+        if actual is not None:
+            yield json.dumps(actual, ensure_ascii=False) + "\n"
+
+
+@router.get("/export")
+def exportar_pagos(user: str = Depends(require_auth), desde: Optional[str] = None, hasta: Optional[str] = None,
+                   formato: str = "csv", lineas: bool = False):
+    """Export completo de pagos (y opcionalmente sus líneas) en CSV o NDJSON, enviado por bloques."""
+    if formato not in FORMATOS_EXPORT:
+        raise HTTPException(status_code=400, detail="Formato inválido (csv o ndjson)")
+    stmt = export_select(filtro_fechas(desde, hasta), lineas)
+    nombre = "pagos" + ("_lineas" if lineas else "") + (f"_{desde}" if desde else "") + (f"_{hasta}" if hasta else "")
+    nombre = nombre.replace(":", "-")
+    return StreamingResponse(
+        exportar(read_engine, stmt, formato, lineas),
+        media_type=FORMATOS_EXPORT[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
+
+
+class TopProductoOut(BaseModel):
+    producto_id: int
+    nombre: str
+    cantidad: int
+    total: float
+
+
+class HoraOut(BaseModel):
+    hora: int
+    total: float
+    pagos: int
+    top: List[TopProductoOut]
+
+
+class MesaOut(BaseModel):
+    mesa_numero: int
+    total: float
+    pagos: int
+    ticket_promedio: float
+
+
+class DiaSemanaOut(BaseModel):
+    # 0 = domingo ... 6 = sábado
+    dia_semana: int
+    total: float
+    pagos: int
+    ticket_promedio: float
+
+
+class AnaliticaOut(BaseModel):
+    # Inicio efectivo del rango (el por defecto si no se indicó ``desde``)
+    desde: str
+    pagos: int
+    lineas: int
+    total: float
+    por_hora: List[HoraOut]
+    por_mesa: List[MesaOut]
+    por_dia_semana: List[DiaSemanaOut]
+
+
+@router.get("/analitica", response_model=AnaliticaOut)
+def analitica(db: Session = Depends(get_read_db), user: str = Depends(require_auth),
+              desde: Optional[str] = None, hasta: Optional[str] = None,
+              top: int = Query(ANALYTICS_TOP, ge=1, le=50)):
+    """Top productos por hora, ventas por mesa y por día de la semana (ver analytics.py)."""
+    if not desde:
+        desde = desde_por_defecto(parse_fecha(hasta, "hasta"))
+    return {"desde": desde, **analytics_cache.get(db, (desde, hasta, top), filtro_fechas(desde, hasta), top)}
@@ -1,12 +1,19 @@
 from typing import List
 import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Request, Header, Response, Query
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from pydantic import BaseModel, Field
 
-from database import get_db
-from models import Mesa, Producto, Orden, OrdenDetalle, Pago
+from board import BoardOrder, board, order_event
+from catalog import catalog
+from lifecycle import registrar, registrar_items
+from rollup import registrar_pago
+from pagination import PAGE_SIZE, PAGE_SIZE_MAX, decode_cursor, set_next_cursor
+from models import Mesa, Orden, OrdenDetalle, Pago
+from writer import writer
 from security import generate_order_token, verify_order_token, TOKEN_TTL
 
 
@@ -42,33 +49,58 @@ class OrderOut(BaseModel):
 
     model_config = {"from_attributes": True}
 
-def order_to_out(order: Orden, db: Session) -> OrderOut:
-    items_out: List[OrderItemOut] = []
-    for det in order.detalles:
-        prod = db.get(Producto, det.producto_id)
-        entregados = int(getattr(det, 'entregados', 0))
-        items_out.append(
-            OrderItemOut(
-                producto_id=prod.id,
-                nombre=prod.nombre,
-                precio=prod.precio,
-                cantidad=det.cantidad,
-                entregado=entregados >= det.cantidad,
-                entregados=entregados,
-            )
+def open_orders_select():
+    """Órdenes sin pago (anti-join sobre pagos) con mesa y detalles precargados.
+
+    Lista el tablero completo con un número fijo de consultas sin importar
+    cuántas órdenes históricas existan. Sirve igual para Session y AsyncSession.
+    """
+    return (
+        select(Orden)
+        .outerjoin(Pago, Pago.orden_id == Orden.id)
+        .where(Pago.id.is_(None))
+        .options(
+            joinedload(Orden.mesa),
+            selectinload(Orden.detalles),
         )
-    mesa = db.get(Mesa, order.mesa_id)
-    pagado = db.query(Pago).filter(Pago.orden_id == order.id).first() is not None
-    return OrderOut(
-        id=order.id,
-        mesa_numero=mesa.numero,
-        fecha=order.fecha,
-        estado=order.estado,
-        items=items_out,
-        pagado=pagado,
     )
 
 
+def open_order_for_mesa_select(mesa_id):
+    # ix_ordenes_abiertas (mesa_id, fecha) resuelve filtro y orden sin recorrer el historial de la mesa. SQLite
+    # sólo usa el índice parcial si el filtro es exactamente su predicado "abierta = 1" (is_(True) da "IS 1")
+    return (
+        open_orders_select()
+        .where(Orden.mesa_id == mesa_id, Orden.abierta == True)  # noqa: E712
+        .order_by(Orden.fecha.desc(), Orden.id.desc())
+        .limit(1)
+    )
+
+
+def order_select(orden_id: int):
+    """Una orden con mesa y detalles cargados, lista para el tablero sin lazy loads."""
+    return orders_select([orden_id])
+
+
+def orders_select(orden_ids):
+    return (
+        select(Orden)
+        .where(Orden.id.in_(orden_ids))
+        .options(joinedload(Orden.mesa), selectinload(Orden.detalles))
+        .execution_options(populate_existing=True)
+    )
+
+
+def open_orders(db: Session) -> List[Orden]:
+    return db.scalars(open_orders_select().order_by(Orden.fecha.asc(), Orden.id.asc())).all()
+
+
+def derive_estado(order: Orden) -> str:
+    all_delivered = all(int(d.entregados or 0) >= d.cantidad for d in order.detalles)
+    any_delivered = any(int(d.entregados or 0) > 0 for d in order.detalles)
+    return "entregado" if all_delivered else ("en_proceso" if any_delivered else "pendiente")
+
+
 class TokenOut(BaseModel):
     mesa_numero: int
     token: str
@@ -83,83 +115,119 @@ def obtener_token_mesa(mesa_numero: int):
     _mesa_str, exp_str = msg.split(':')
     return TokenOut(mesa_numero=mesa_numero, token=token, exp=int(exp_str), ttl=TOKEN_TTL)
 
-@router.post("/orden", response_model=OrderOut)
-async def crear_orden(payload: OrderCreate, request: Request, db: Session = Depends(get_db), qr_token: str | None = Header(default=None, alias='X-QR-Token')):
-    # Verificar token obligatorio para prevención de abuso
-    verify_order_token(qr_token or "", expected_mesa_numero=payload.mesa_numero)
-    
-    mesa = db.query(Mesa).filter(Mesa.numero == payload.mesa_numero).first()
+async def _insert_detalles(db: AsyncSession, orden_id: int, cantidades: dict[int, int], productos: dict) -> float:
+    """Inserta las líneas nuevas de una orden en un solo executemany; devuelve su importe."""
+    if not cantidades:
+        return 0.0
+    await db.execute(
+        insert(OrdenDetalle),
+        [
+            {
+                "orden_id": orden_id,
+                "producto_id": producto_id,
+                "cantidad": cantidad,
+                "entregado": False,
+                "entregados": 0,
+                "precio_unitario": productos[producto_id].precio,
+            }
+            for producto_id, cantidad in cantidades.items()
+        ],
+    )
+    return sum(productos[producto_id].precio * cantidad for producto_id, cantidad in cantidades.items())
+
+
+async def _crear_o_mergear(db: AsyncSession, mesa_numero: int, cantidades: dict[int, int]) -> tuple[BoardOrder, bool]:
+    """Operación del escritor: agrega los items a la orden abierta de la mesa o crea una nueva."""
+    # Validar todos los productos de una vez (catálogo + una sola consulta IN para los faltantes)
+    productos = await catalog.aget_many(db, cantidades.keys())
+    for producto_id in cantidades:
+        if producto_id not in productos:
+            raise HTTPException(status_code=400, detail=f"Producto {producto_id} no existe")
+
+    mesa = await db.scalar(select(Mesa).where(Mesa.numero == mesa_numero))
     if not mesa:
         # Crear mesa automáticamente si no existe
-        mesa = Mesa(numero=payload.mesa_numero)
+        mesa = Mesa(numero=mesa_numero)
         db.add(mesa)
-        db.commit()
-        db.refresh(mesa)
-    if not payload.items:
-        raise HTTPException(status_code=400, detail="La orden debe tener al menos un item")
+        await db.flush()
 
-    # Buscar una orden abierta (no cobrada) para esta mesa
-    existing_orders = (
-        db.query(Orden)
-        .filter(Orden.mesa_id == mesa.id)
-        .order_by(Orden.fecha.desc())
-        .all()
-    )
-    open_order = None
-    for o in existing_orders:
-        if db.query(Pago).filter(Pago.orden_id == o.id).first() is None:
-            open_order = o
-            break
+    # Buscar una orden abierta (no cobrada) para esta mesa; sus detalles llegan precargados
+    open_order = await db.scalar(open_order_for_mesa_select(mesa.id))
 
     if open_order:
         order = open_order
         # Si la orden estaba entregada y llegan nuevos items, vuelve a pendiente
         if order.estado == "entregado":
             order.estado = "pendiente"
-        # Mergear/agregar items
-        for item in payload.items:
-            prod = db.get(Producto, item.producto_id)
-            if not prod:
-                raise HTTPException(status_code=400, detail=f"Producto {item.producto_id} no existe")
-            det = (
-                db.query(OrdenDetalle)
-                .filter(OrdenDetalle.orden_id == order.id, OrdenDetalle.producto_id == item.producto_id)
-                .first()
-            )
+        # Mergear/agregar items contra los detalles existentes indexados por producto
+        existentes = {d.producto_id: d for d in order.detalles}
+        nuevos: dict[int, int] = {}
+        agregado = 0.0
+        for producto_id, cantidad in cantidades.items():
+            det = existentes.get(producto_id)
             if det:
-                det.cantidad += item.cantidad
+                det.cantidad += cantidad
                 # Nuevas cantidades implican que aún no están entregadas
-                if hasattr(det, 'entregado'):
-                    det.entregado = False
+                det.entregado = False
+                # Las unidades agregadas a una línea abierta van al precio con que se pidió la línea
+                if det.precio_unitario is None:
+                    det.precio_unitario = productos[producto_id].precio
+                agregado += det.precio_unitario * cantidad
             else:
-                db.add(OrdenDetalle(orden_id=order.id, producto_id=item.producto_id, cantidad=item.cantidad, entregado=False))
-        db.commit()
-        db.refresh(order)
-        out = order_to_out(order, db)
-        await request.app.state.order_manager.broadcast({"type": "update_order", "order": out.model_dump()})
-        return out
+                nuevos[producto_id] = cantidad
+        registrar_items(db, order, cantidades, creada=False)
+        agregado += await _insert_detalles(db, order.id, nuevos, productos)
+        order.subtotal = (order.subtotal or 0.0) + agregado
+        # La sesión no hace autoflush: escribir cantidades y subtotal antes de recargar con populate_existing
+        await db.flush()
+        return BoardOrder.from_orm(await db.scalar(order_select(order.id))), False
 
     # No existe orden abierta: crear nueva
     order = Orden(mesa_id=mesa.id, estado="pendiente")
     db.add(order)
-    db.flush()  # obtiene order.id
+    await db.flush()  # obtiene order.id
+    order.subtotal = await _insert_detalles(db, order.id, cantidades, productos)
+    registrar_items(db, order, cantidades, creada=True)
+    await db.flush()
+    return BoardOrder.from_orm(await db.scalar(order_select(order.id))), True
+
+
+@router.post("/orden", response_model=OrderOut)
+async def crear_orden(payload: OrderCreate, request: Request, qr_token: str | None = Header(default=None, alias='X-QR-Token')):
+    # Verificar token obligatorio para prevención de abuso
+    verify_order_token(qr_token or "", expected_mesa_numero=payload.mesa_numero)
+    
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="La orden debe tener al menos un item")
+
+    # Colapsar productos repetidos del payload antes de tocar la BD
+    cantidades: dict[int, int] = {}
     for item in payload.items:
-        prod = db.get(Producto, item.producto_id)
-        if not prod:
-            raise HTTPException(status_code=400, detail=f"Producto {item.producto_id} no existe")
-        db.add(OrdenDetalle(orden_id=order.id, producto_id=item.producto_id, cantidad=item.cantidad, entregado=False))
-    db.commit()
-    db.refresh(order)
-    out = order_to_out(order, db)
-    await request.app.state.order_manager.broadcast({"type": "new_order", "order": out.model_dump()})
-    return out
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+
+    entry, created = await writer.submit(lambda db: _crear_o_mergear(db, payload.mesa_numero, cantidades))
+    entry, delta = board.update(entry)
+    await request.app.state.order_manager.broadcast(order_event("new_order" if created else "update_order", entry, delta))
+    return entry.to_dict()
 
 
 @router.get("/ordenes", response_model=List[OrderOut])
-def listar_ordenes(db: Session = Depends(get_db)):
-    orders = db.query(Orden).order_by(Orden.fecha.asc()).all()
-    visibles = [o for o in orders if db.query(Pago).filter(Pago.orden_id == o.id).first() is None]
-    return [order_to_out(o, db) for o in visibles]
+def listar_ordenes(
+    response: Response,
+    limit: int | None = Query(default=None, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = None,
+):
+    """Órdenes abiertas por ``(fecha, id)``; con ``limit``/``cursor`` pagina (ver ``pagination.py``)."""
+    if limit is None and cursor is None:
+        # Se sirve desde el tablero en memoria; el JSON se reutiliza mientras no cambie
+        return Response(content=board.to_json(), media_type="application/json")
+    after = None
+    if cursor:
+        fecha, orden_id = decode_cursor(cursor)
+        after = (fecha or datetime.datetime.min, orden_id)
+    limit = limit or PAGE_SIZE
+    entries = set_next_cursor(response, board.page(after, limit), limit, lambda e: (e.fecha, e.id))
+    return [e.to_dict() for e in entries]
 
 
 class EstadoUpdate(BaseModel):
@@ -169,21 +237,34 @@ class EstadoUpdate(BaseModel):
 VALID_ESTADOS = {"pendiente", "en_proceso", "entregado"}
 
 
+async def _load_order(db: AsyncSession, orden_id: int) -> Orden:
+    order = await db.scalar(order_select(orden_id))
+    if not order:
+        raise HTTPException(status_code=404, detail="Orden no encontrada")
+    return order
+
+
+async def update_estado(db: AsyncSession, orden_id: int, estado: str) -> BoardOrder:
+    """Operación del escritor: estado puesto a mano (endpoint o voz)."""
+    order = await _load_order(db, orden_id)
+    order.estado = estado
+    registrar(db, order.id, "estado", order.estado)
+    return BoardOrder.from_orm(order)
+
+
 @router.patch("/orden/{orden_id}/estado", response_model=OrderOut)
-async def actualizar_estado(orden_id: int, payload: EstadoUpdate, request: Request, db: Session = Depends(get_db)):
+async def actualizar_estado(orden_id: int, payload: EstadoUpdate, request: Request):
     if payload.estado not in VALID_ESTADOS:
         raise HTTPException(status_code=400, detail="Estado inválido")
-    order = db.get(Orden, orden_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Orden no encontrada")
 
-    order.estado = payload.estado
-    db.commit()
-    db.refresh(order)
+    entry = await writer.submit(lambda db: update_estado(db, orden_id, payload.estado))
 
-    out = order_to_out(order, db)
+    out = board.upsert(entry).to_dict()
     await request.app.state.order_manager.broadcast(
-        {"type": "update_status", "order": {"id": out.id, "estado": out.estado}}
+        {
+            "type": "update_status",
+            "order": {"id": out["id"], "mesa_numero": out["mesa_numero"], "estado": out["estado"], "version": out["version"]},
+        }
     )
     return out
 
@@ -204,69 +285,72 @@ class PagoOut(BaseModel):
 
     model_config = {"from_attributes": True}
 
-@router.post("/orden/{orden_id}/cobro", response_model=PagoOut)
-async def cobrar_orden(orden_id: int, payload: CobroPayload, request: Request, db: Session = Depends(get_db)):
-    if payload.metodo not in VALID_METODOS:
-        raise HTTPException(status_code=400, detail="Método inválido")
-    order = db.get(Orden, orden_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Orden no encontrada")
+async def _cobrar(db: AsyncSession, orden_id: int, payload: CobroPayload) -> tuple[PagoOut, int | None]:
+    order = await _load_order(db, orden_id)
     if order.estado != "entregado":
         raise HTTPException(status_code=400, detail="La orden debe estar 'entregado' para cobrar")
-    existing = db.query(Pago).filter(Pago.orden_id == orden_id).first()
-    if existing:
+    # abierta se apaga en la misma transacción que inserta el pago (y pagos.orden_id es único)
+    if not order.abierta:
         raise HTTPException(status_code=400, detail="Orden ya cobrada")
 
-    total = 0.0
-    for det in order.detalles:
-        prod = db.get(Producto, det.producto_id)
-        total += float(prod.precio) * det.cantidad
-
+    order.abierta = False
     p = Pago(
         orden_id=orden_id,
         metodo=payload.metodo,
-        monto_total=total,
+        # Subtotal mantenido al pedir: sin recorrer líneas ni consultar el catálogo
+        monto_total=order.subtotal or 0.0,
         propina=float(payload.propina or 0.0),
     )
     db.add(p)
-    db.commit()
-    db.refresh(p)
+    registrar(db, orden_id, "cobrada", order.estado)
+    await db.flush()
+    # En la misma transacción: el resumen por hora nunca queda atrás de pagos
+    await registrar_pago(db, p)
+    return PagoOut.model_validate(p), order.mesa.numero if order.mesa else None
+
+
+@router.post("/orden/{orden_id}/cobro", response_model=PagoOut)
+async def cobrar_orden(orden_id: int, payload: CobroPayload, request: Request):
+    if payload.metodo not in VALID_METODOS:
+        raise HTTPException(status_code=400, detail="Método inválido")
+    p, mesa_numero = await writer.submit(lambda db: _cobrar(db, orden_id, payload))
+    board.remove(orden_id)
     # Notificar a paneles que la orden fue pagada (para removerla)
-    await request.app.state.order_manager.broadcast({"type": "order_paid", "orden_id": orden_id})
+    await request.app.state.order_manager.broadcast({"type": "order_paid", "orden_id": orden_id, "mesa_numero": mesa_numero})
     return p
 
 
+async def _load_order_item(db: AsyncSession, orden_id: int, producto_id: int) -> tuple[Orden, OrdenDetalle]:
+    order = await _load_order(db, orden_id)
+    det = next((d for d in order.detalles if d.producto_id == producto_id), None)
+    if not det:
+        raise HTTPException(status_code=404, detail="Item no encontrado en la orden")
+    return order, det
+
+
 # --- Nuevo: marcar un ítem como entregado/no entregado ---
 class ItemEntregaUpdate(BaseModel):
     entregado: bool
 
 @router.patch("/orden/{orden_id}/item/{producto_id}/entregado", response_model=OrderOut)
-async def marcar_item_entregado(orden_id: int, producto_id: int, payload: ItemEntregaUpdate, request: Request, db: Session = Depends(get_db)):
-    order = db.get(Orden, orden_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Orden no encontrada")
-    det = (
-        db.query(OrdenDetalle)
-        .filter(OrdenDetalle.orden_id == orden_id, OrdenDetalle.producto_id == producto_id)
-        .first()
-    )
-    if not det:
-        raise HTTPException(status_code=404, detail="Item no encontrado en la orden")
-
-    # Actualizar estado del item
-    det.entregado = bool(payload.entregado)
+async def marcar_item_entregado(orden_id: int, producto_id: int, payload: ItemEntregaUpdate, request: Request):
+    async def op(db: AsyncSession) -> BoardOrder:
+        order, det = await _load_order_item(db, orden_id, producto_id)
 
-    # Derivar estado de la orden
-    all_delivered = all(bool(getattr(d, 'entregado', False)) for d in order.detalles)
-    any_delivered = any(bool(getattr(d, 'entregado', False)) for d in order.detalles)
-    order.estado = "entregado" if all_delivered else ("en_proceso" if any_delivered else "pendiente")
+        # Actualizar estado del item
+        det.entregado = bool(payload.entregado)
 
-    db.commit()
-    db.refresh(order)
+        # Derivar estado de la orden
+        all_delivered = all(bool(d.entregado) for d in order.detalles)
+        any_delivered = any(bool(d.entregado) for d in order.detalles)
+        order.estado = "entregado" if all_delivered else ("en_proceso" if any_delivered else "pendiente")
+        # Marcado sin contar unidades: entregado equivale a todas las unidades
+        registrar(db, order.id, "entrega", order.estado, producto_id, det.cantidad if det.entregado else int(det.entregados or 0))
+        return BoardOrder.from_orm(order)
 
-    out = order_to_out(order, db)
-    await request.app.state.order_manager.broadcast({"type": "update_order", "order": out.model_dump()})
-    return out
+    entry, delta = board.update(await writer.submit(op))
+    await request.app.state.order_manager.broadcast(order_event("update_order", entry, delta))
+    return entry.to_dict()
 
 
 # --- Nuevo: actualizar cantidad entregada por ítem ---
@@ -274,29 +358,92 @@ class ItemEntregadosUpdate(BaseModel):
     entregados: int = Field(ge=0)
 
 @router.patch("/orden/{orden_id}/item/{producto_id}/entregados", response_model=OrderOut)
-async def actualizar_item_entregados(orden_id: int, producto_id: int, payload: ItemEntregadosUpdate, request: Request, db: Session = Depends(get_db)):
-    order = db.get(Orden, orden_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Orden no encontrada")
-    det = (
-        db.query(OrdenDetalle)
-        .filter(OrdenDetalle.orden_id == orden_id, OrdenDetalle.producto_id == producto_id)
-        .first()
-    )
-    if not det:
-        raise HTTPException(status_code=404, detail="Item no encontrado en la orden")
+async def actualizar_item_entregados(orden_id: int, producto_id: int, payload: ItemEntregadosUpdate, request: Request):
+    async def op(db: AsyncSession) -> BoardOrder:
+        order, det = await _load_order_item(db, orden_id, producto_id)
+
+        nuevo = max(0, min(int(payload.entregados), det.cantidad))
+        det.entregados = nuevo
+        det.entregado = det.entregados >= det.cantidad
+        order.estado = derive_estado(order)
+        registrar(db, order.id, "entrega", order.estado, producto_id, nuevo)
+        return BoardOrder.from_orm(order)
+
+    entry, delta = board.update(await writer.submit(op))
+    await request.app.state.order_manager.broadcast(order_event("update_order", entry, delta))
+    return entry.to_dict()
 
-    nuevo = max(0, min(int(payload.entregados), det.cantidad))
-    det.entregados = nuevo
-    det.entregado = det.entregados >= det.cantidad
 
-    all_delivered = all(int(getattr(d, 'entregados', 0)) >= d.cantidad for d in order.detalles)
-    any_delivered = any(int(getattr(d, 'entregados', 0)) > 0 for d in order.detalles)
-    order.estado = "entregado" if all_delivered else ("en_proceso" if any_delivered else "pendiente")
+# --- Cambios en lote: entregas y estados de varias órdenes en una sola transacción ---
+class EntregaCambio(BaseModel):
+    orden_id: int
+    producto_id: int
+    entregados: int = Field(ge=0)
+
+
+class EstadoCambio(BaseModel):
+    orden_id: int
+    estado: str
 
-    db.commit()
-    db.refresh(order)
 
-    out = order_to_out(order, db)
-    await request.app.state.order_manager.broadcast({"type": "update_order", "order": out.model_dump()})
-    return out
\ No newline at end of file
+class LoteUpdate(BaseModel):
+    items: List[EntregaCambio] = []
+    estados: List[EstadoCambio] = []
+
+
+async def _aplicar_lote(db: AsyncSession, payload: LoteUpdate) -> list[BoardOrder]:
+    """Operación del escritor: aplica todos los cambios o ninguno.
+
+    Todo el lote se valida antes de tocar la sesión; si algo falla no queda ningún
+    objeto modificado (ni expirado por el rollback) para las demás operaciones.
+    """
+    ids = sorted({c.orden_id for c in payload.items} | {c.orden_id for c in payload.estados})
+    orders = {o.id: o for o in (await db.scalars(orders_select(ids))).unique().all()}
+    # Validar el lote completo antes de modificar cualquier objeto de la sesión
+    for orden_id in ids:
+        if orden_id not in orders:
+            raise HTTPException(status_code=404, detail=f"Orden {orden_id} no encontrada")
+    detalles: dict[tuple[int, int], OrdenDetalle] = {}
+    for cambio in payload.items:
+        det = next((d for d in orders[cambio.orden_id].detalles if d.producto_id == cambio.producto_id), None)
+        if not det:
+            raise HTTPException(status_code=404, detail=f"Item {cambio.producto_id} no encontrado en la orden {cambio.orden_id}")
+        detalles[(cambio.orden_id, cambio.producto_id)] = det
+    if any(c.estado not in VALID_ESTADOS for c in payload.estados):
+        raise HTTPException(status_code=400, detail="Estado inválido")
+
+    for cambio in payload.items:
+        det = detalles[(cambio.orden_id, cambio.producto_id)]
+        det.entregados = max(0, min(int(cambio.entregados), det.cantidad))
+        det.entregado = det.entregados >= det.cantidad
+
+    # El estado se deriva una sola vez por orden; un estado explícito del lote tiene prioridad
+    for orden_id in {c.orden_id for c in payload.items}:
+        orders[orden_id].estado = derive_estado(orders[orden_id])
+    for cambio in payload.estados:
+        orders[cambio.orden_id].estado = cambio.estado
+    # Eventos con el estado final de cada orden (el que queda al confirmar el lote)
+    for cambio in payload.items:
+        det = detalles[(cambio.orden_id, cambio.producto_id)]
+        registrar(db, cambio.orden_id, "entrega", orders[cambio.orden_id].estado, det.producto_id, det.entregados)
+    for cambio in payload.estados:
+        registrar(db, cambio.orden_id, "estado", cambio.estado)
+    return [BoardOrder.from_orm(orders[orden_id]) for orden_id in ids]
+
+
+@router.patch("/ordenes/lote", response_model=List[OrderOut])
+async def actualizar_lote(payload: LoteUpdate, request: Request):
+    if not payload.items and not payload.estados:
+        raise HTTPException(status_code=400, detail="El lote no tiene cambios")
+
+    entries = await writer.submit(lambda db: _aplicar_lote(db, payload))
+
+    events = []
+    out = []
+    for entry in entries:
+        entry, delta = board.update(entry)
+        events.append(order_event("update_order", entry, delta))
+        out.append(entry.to_dict())
+    # Un solo mensaje para todos los paneles con todas las órdenes afectadas
+    await request.app.state.order_manager.broadcast({"type": "batch", "events": events})
+    return out
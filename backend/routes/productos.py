@@ -1,9 +1,11 @@
+import os
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from database import get_db
+from catalog import catalog
+from database import get_db, get_read_db
 from models import Producto, OrdenDetalle
 
 
@@ -18,10 +20,47 @@ class ProductoOut(BaseModel):
 
 router = APIRouter(prefix="/api", tags=["productos"])
 
+# Segundos que el navegador puede reutilizar el menú sin revalidar (0 = revalidar siempre con ETag)
+MENU_MAX_AGE = int(os.getenv("MENU_MAX_AGE", "0"))
+
+
+def _menu_cache_control() -> str:
+    if MENU_MAX_AGE > 0:
+        return f"public, max-age={MENU_MAX_AGE}, must-revalidate"
+    return "public, no-cache"
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in candidates)
+
+
+class CatalogVersionOut(BaseModel):
+    version: int
+
 
 @router.get("/productos", response_model=List[ProductoOut])
-def listar_productos(db: Session = Depends(get_db)):
-    return db.query(Producto).all()
+def listar_productos(request: Request, db: Session = Depends(get_read_db)):
+    body, etag = catalog.menu(db)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": _menu_cache_control(),
+        "X-Catalog-Version": str(catalog.version),
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/productos/version", response_model=CatalogVersionOut)
+def version_productos(db: Session = Depends(get_read_db)):
+    catalog.ensure(db)
+    return CatalogVersionOut(version=catalog.version)
 
 # --- Nuevos endpoints CRUD ---
 class ProductoCreate(BaseModel):
@@ -36,17 +75,24 @@ class ProductoUpdate(BaseModel):
     imagen: Optional[str] = None
 
 
+def _notify_catalog_changed(request: Request, producto_id: int) -> None:
+    # Los demás workers recargan su catálogo al recibir el evento por el bus
+    request.app.state.order_manager.publish({"type": "catalog_changed", "producto_id": producto_id})
+
+
 @router.post("/producto", response_model=ProductoOut)
-def crear_producto(payload: ProductoCreate, db: Session = Depends(get_db)):
+def crear_producto(payload: ProductoCreate, request: Request, db: Session = Depends(get_db)):
     p = Producto(nombre=payload.nombre, precio=payload.precio, imagen=payload.imagen)
     db.add(p)
     db.commit()
     db.refresh(p)
+    catalog.put(p)
+    _notify_catalog_changed(request, p.id)
     return p
 
 
 @router.patch("/producto/{producto_id}", response_model=ProductoOut)
-def actualizar_producto(producto_id: int, payload: ProductoUpdate, db: Session = Depends(get_db)):
+def actualizar_producto(producto_id: int, payload: ProductoUpdate, request: Request, db: Session = Depends(get_db)):
     p = db.get(Producto, producto_id)
     if not p:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -58,11 +104,13 @@ def actualizar_producto(producto_id: int, payload: ProductoUpdate, db: Session =
         p.imagen = payload.imagen
     db.commit()
     db.refresh(p)
+    catalog.put(p)
+    _notify_catalog_changed(request, p.id)
     return p
 
 
 @router.delete("/producto/{producto_id}")
-def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
+def eliminar_producto(producto_id: int, request: Request, db: Session = Depends(get_db)):
     p = db.get(Producto, producto_id)
     if not p:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -72,4 +120,6 @@ def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="No se puede eliminar: producto con órdenes asociadas")
     db.delete(p)
     db.commit()
+    catalog.remove(producto_id)
+    _notify_catalog_changed(request, producto_id)
     return {"ok": True}
\ No newline at end of file
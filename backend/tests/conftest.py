@@ -0,0 +1,11 @@
+"""Los módulos del backend se importan como en ``main.py`` (desde backend/), contra una BD temporal."""
+import os
+import sys
+import tempfile
+
+# Antes de importar ``database``: los engines se crean al importar el módulo
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_READONLY_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+"""Log de eventos entre workers: un evento que no se puede aplicar no bloquea a los siguientes."""
+import json
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from bus import SqliteLogBus
+from database import engine, for_writes
+from migrations import run_migrations
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    run_migrations(engine)
+
+
+class _Manager:
+    seq = 0
+
+    def __init__(self):
+        self.entregados: list[tuple[int, dict]] = []
+
+    def deliver_threadsafe(self, data: dict, seq: int) -> None:
+        self.entregados.append((seq, data))
+
+
+def _publicar_ajeno(*eventos: dict) -> None:
+    with for_writes(engine).begin() as conn:
+        for data in eventos:
+            conn.execute(
+                text("INSERT INTO ws_eventos (origen, payload) VALUES ('otro-worker', :p)"),
+                {"p": json.dumps(data)},
+            )
+
+
+def test_evento_venenoso_no_bloquea_el_log(caplog):
+    def on_remote(data: dict) -> None:
+        if data["type"] == "veneno":
+            raise ValueError("no se puede aplicar")
+
+    bus = SqliteLogBus(engine, on_remote=on_remote)
+    bus.open()
+    bus._manager = manager = _Manager()
+    try:
+        _publicar_ajeno({"type": "veneno"}, {"type": "order_paid", "orden_id": 1})
+        with caplog.at_level(logging.ERROR, logger="bus"):
+            bus._read()
+        veneno, bueno = range(bus.last_id - 1, bus.last_id + 1)
+        assert [seq for seq, _data in manager.entregados] == [bueno]
+        assert f"evento {veneno} " in caplog.text
+
+        # El siguiente sondeo ya no relee el evento descartado
+        bus._read()
+        assert len(manager.entregados) == 1
+    finally:
+        bus.stop()
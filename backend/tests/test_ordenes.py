@@ -0,0 +1,31 @@
+"""La orden abierta de una mesa se busca por el índice parcial, sin recorrer el historial de la mesa."""
+import pytest
+from sqlalchemy import select
+
+from database import engine
+from migrations import run_migrations
+from models import Mesa
+from routes.ordenes import open_order_for_mesa_select
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    run_migrations(engine)
+
+
+def _plan(stmt) -> list[str]:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+@pytest.mark.parametrize(
+    "mesa_id",
+    [1, select(Mesa.id).where(Mesa.numero == 1).scalar_subquery()],
+    ids=["mesa_id", "mesa_numero"],
+)
+def test_orden_abierta_usa_indice_parcial(mesa_id):
+    plan = _plan(open_order_for_mesa_select(mesa_id))
+    ordenes = [step for step in plan if step.startswith("SEARCH ordenes ")]
+    assert ordenes and all("ix_ordenes_abiertas" in step for step in ordenes), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
@@ -0,0 +1,97 @@
+"""Escritor único: una operación fallida no deja cambios ni afecta a las demás del lote."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from board import board
+from database import ReadSessionLocal, engine
+from migrations import run_migrations
+from routes.ordenes import (
+    EntregaCambio,
+    EstadoCambio,
+    LoteUpdate,
+    _aplicar_lote,
+    _crear_o_mergear,
+    _load_order,
+    open_orders,
+    update_estado,
+)
+from writer import OrderWriter
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    run_migrations(engine)
+
+
+async def _falla(db, orden_id: int):
+    # Recarga la misma orden en la sesión compartida y la modifica antes de fallar
+    order = await _load_order(db, orden_id)
+    order.estado = "entregado"
+    await db.flush()
+    raise HTTPException(status_code=409, detail="falla a propósito")
+
+
+def test_lote_con_una_operacion_fallida():
+    async def run():
+        writer = OrderWriter()
+        writer.start()
+        entry, _created = await writer.submit(lambda db: _crear_o_mergear(db, 1, {1: 2}))
+        board.update(entry)
+        # Se encolan antes de que el escritor despierte: un solo lote, una sola sesión
+        results = await asyncio.gather(
+            writer.submit(lambda db: update_estado(db, entry.id, "en_proceso")),
+            writer.submit(lambda db: _falla(db, entry.id)),
+            writer.submit(lambda db: _crear_o_mergear(db, 2, {1: 1})),
+            return_exceptions=True,
+        )
+        stats = writer.stats()
+        await writer.stop()
+        return results, stats
+
+    (actualizada, fallo, creada), stats = asyncio.run(run())
+    assert stats["lote_mayor"] == 3
+
+    assert isinstance(fallo, HTTPException) and fallo.status_code == 409
+    assert not isinstance(actualizada, BaseException)
+    assert not isinstance(creada, BaseException)
+
+    entry, delta = board.update(actualizada)
+    assert entry.estado == "en_proceso" and delta["estado"] == "en_proceso"
+    nueva, created = creada
+    assert created and nueva.mesa_numero == 2
+    board.update(nueva)
+
+    with ReadSessionLocal() as db:
+        assert board.check(open_orders(db)) == []
+
+
+def test_lote_invalido_no_modifica_nada():
+    async def run():
+        writer = OrderWriter()
+        writer.start()
+        entry, _created = await writer.submit(lambda db: _crear_o_mergear(db, 3, {1: 2, 2: 1}))
+        board.update(entry)
+        # Cada lote trae un cambio válido antes del inválido
+        valido = EntregaCambio(orden_id=entry.id, producto_id=1, entregados=2)
+        invalidos = [
+            LoteUpdate(items=[valido, EntregaCambio(orden_id=entry.id, producto_id=99, entregados=1)]),
+            LoteUpdate(items=[valido], estados=[EstadoCambio(orden_id=entry.id, estado="cobrado")]),
+        ]
+        results = await asyncio.gather(
+            *(writer.submit(lambda db, p=p: _aplicar_lote(db, p)) for p in invalidos),
+            return_exceptions=True,
+        )
+        await writer.stop()
+        return entry, results
+
+    entry, (sin_item, sin_estado) = asyncio.run(run())
+    assert isinstance(sin_item, HTTPException) and sin_item.status_code == 404
+    assert isinstance(sin_estado, HTTPException) and sin_estado.status_code == 400
+
+    with ReadSessionLocal() as db:
+        assert board.check(open_orders(db)) == []
+        orden = next(o for o in open_orders(db) if o.id == entry.id)
+        assert orden.estado == "pendiente"
+        assert all(d.entregados == 0 for d in orden.detalles)
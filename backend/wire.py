@@ -0,0 +1,87 @@
+"""Codificaciones de los mensajes de ``/ws/ordenes``.
+
+JSON es la predeterminada. Con ``?encoding=msgpack`` el cliente recibe
+frames binarios MessagePack en los que los nombres de campo se reemplazan
+por enteros (``FIELD_TAGS``); los valores no cambian. Cada evento se
+serializa una sola vez por codificación, sin importar cuántos clientes la
+usen.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:  # dependencia opcional: sin ella solo se ofrece JSON
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Etiquetas de campo para MessagePack (sobres, órdenes, líneas y deltas comparten la tabla).
+# Solo se agregan etiquetas nuevas al final: los clientes ya desplegados dependen de estas.
+FIELD_TAGS = {
+    "type": 0,
+    "seq": 1,
+    "id": 2,
+    "mesa_numero": 3,
+    "fecha": 4,
+    "estado": 5,
+    "items": 6,
+    "pagado": 7,
+    "version": 8,
+    "base": 9,
+    "removed": 10,
+    "producto_id": 11,
+    "nombre": 12,
+    "precio": 13,
+    "cantidad": 14,
+    "entregado": 15,
+    "entregados": 16,
+    "order": 17,
+    "orden_id": 18,
+    "orders": 19,
+    "epoch": 20,
+}
+TAG_FIELDS = {tag: field for field, tag in FIELD_TAGS.items()}
+
+
+def available_encodings() -> tuple[str, ...]:
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+def negotiate(requested: str | None) -> str:
+    """Codificación a usar para un cliente; JSON si pidió algo que no está disponible."""
+    return requested if requested in available_encodings() else JSON
+
+
+def tag(value):
+    """Reemplaza recursivamente los nombres de campo conocidos por su etiqueta entera."""
+    if isinstance(value, dict):
+        return {FIELD_TAGS.get(k, k): tag(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [tag(v) for v in value]
+    return value
+
+
+def untag(value):
+    if isinstance(value, dict):
+        return {TAG_FIELDS.get(k, k): untag(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [untag(v) for v in value]
+    return value
+
+
+def encode_json(data: dict) -> str:
+    # Mismo formato que WebSocket.send_json
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_msgpack(data: dict) -> bytes:
+    return msgpack.packb(tag(data), use_bin_type=True)
+
+
+def decode_msgpack(payload: bytes) -> dict:
+    return untag(msgpack.unpackb(payload, raw=False, strict_map_key=False))
+
+
+def encode(data: dict, encoding: str = JSON) -> str | bytes:
+    return encode_msgpack(data) if encoding == MSGPACK else encode_json(data)
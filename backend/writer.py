@@ -0,0 +1,113 @@
+"""Escritor único para las mutaciones de órdenes.
+
+SQLite admite un solo escritor a la vez. En lugar de que cada petición abra
+su propia sesión y compita por el lock, los endpoints encolan su mutación y
+una única tarea las ejecuta en orden de llegada. Las ráfagas se agrupan en
+una sola transacción (cada operación dentro de su propio SAVEPOINT, así un
+error solo revierte la suya) y cada llamador recibe su resultado a través
+de un future.
+
+Como las operaciones de una misma ráfaga comparten sesión, dos pedidos
+simultáneos para la misma mesa ven la orden abierta que creó el primero.
+Por lo mismo, cada operación devuelve datos ya desligados de la sesión
+(``BoardOrder``, modelos de respuesta, ids): el rollback del SAVEPOINT de
+una operación posterior expira los objetos ORM que cargó la anterior.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+
+T = TypeVar("T")
+
+WRITER_MAX_BATCH = int(os.getenv("WRITER_MAX_BATCH", "64"))
+
+Operation = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class OrderWriter:
+    def __init__(self, session_factory=AsyncSessionLocal, max_batch: int = WRITER_MAX_BATCH):
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, op: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Encola ``op`` y espera su resultado (o la excepción que lanzó)."""
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, fut))
+        return await fut
+
+    def stats(self) -> dict:
+        return {
+            "pendientes": self._queue.qsize() if self._queue else 0,
+            "lotes": self.batches,
+            "operaciones": self.operations,
+            "lote_mayor": self.largest_batch,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < self._max_batch and not self._queue.empty():
+                nxt = self._queue.get_nowait()
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            await self._apply(batch)
+            if stop:
+                return
+
+    async def _apply(self, batch: list[tuple[Operation, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        results: list[tuple[asyncio.Future, Any, BaseException | None]] = []
+        async with self._session_factory() as db:
+            try:
+                for op, fut in batch:
+                    try:
+                        async with db.begin_nested():
+                            value = await op(db)
+                        results.append((fut, value, None))
+                    except Exception as exc:
+                        results.append((fut, None, exc))
+                await db.commit()
+            except Exception as exc:
+                # Si falla la transacción completa, fallan todas las operaciones del lote
+                await db.rollback()
+                results = [(fut, None, exc) for _op, fut in batch]
+        for fut, value, exc in results:
+            if fut.cancelled():
+                continue
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(value)
+
+
+writer = OrderWriter()
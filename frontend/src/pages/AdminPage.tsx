@@ -19,6 +19,41 @@ type OrderOut = {
   estado: 'pendiente' | 'en_proceso' | 'entregado'
   items: OrderItemOut[]
   pagado?: boolean
+  version?: number
+}
+
+// Cambios parciales de una orden (order_delta): solo campos y líneas modificadas
+type OrderDelta = {
+  id: number
+  mesa_numero: number
+  version: number
+  base: number
+  estado?: OrderOut['estado']
+  pagado?: boolean
+  items?: (Partial<OrderItemOut> & { producto_id: number, cantidad: number, entregados: number, entregado: boolean })[]
+  removed?: number[]
+}
+
+const applyDelta = (order: OrderOut, delta: OrderDelta): OrderOut => {
+  const changed = new Map((delta.items || []).map(it => [it.producto_id, it]))
+  const removed = new Set(delta.removed || [])
+  const items = order.items
+    .filter(it => !removed.has(it.producto_id))
+    .map(it => {
+      const upd = changed.get(it.producto_id)
+      if (!upd) return it
+      changed.delete(it.producto_id)
+      return { ...it, ...upd }
+    })
+  // líneas nuevas: llegan completas
+  changed.forEach(it => items.push(it as OrderItemOut))
+  return {
+    ...order,
+    estado: delta.estado ?? order.estado,
+    pagado: delta.pagado ?? order.pagado,
+    items,
+    version: delta.version,
+  }
 }
 
 // Gestión de productos
@@ -58,6 +93,9 @@ export default function AdminPage() {
   const reconnectTimerRef = useRef<number | null>(null)
   const pollTimerRef = useRef<number | null>(null)
   const keepAliveTimerRef = useRef<number | null>(null)
+  // Último evento visto: al reconectar se piden solo los eventos perdidos
+  const lastSeqRef = useRef<number>(0)
+  const epochRef = useRef<string>('')
 
   // Toasts para nuevas órdenes
   const [toasts, setToasts] = useState<{ id: number, text: string }[]>([])
@@ -109,19 +147,22 @@ export default function AdminPage() {
   const [qrLabelBg, setQrLabelBg] = useState<string>('#000000')
 
   useEffect(() => {
-    // cargar órdenes iniciales
-    fetch(`${API_PREFIX}/ordenes`).then(r => r.json()).then((list: OrderOut[]) => {
-      setOrders(list)
-    }).catch(err => setError(String(err)))
+    // las órdenes iniciales llegan como snapshot por el WS (since=0)
+    const loadOrders = () => {
+      fetch(`${API_PREFIX}/ordenes`).then(r => r.json()).then((list: OrderOut[]) => {
+        setOrders(list)
+      }).catch(err => setError(String(err)))
+    }
 
     // cargar productos
     fetch(`${API_PREFIX}/productos`).then(r => r.json()).then((list: ProductoOut[]) => {
       setProductos(list)
     }).catch(err => setProdError(String(err)))
 
-    // conexión WS con reconexión y fallback a polling
+    // conexión WS con reconexión (retomando desde el último seq) y fallback a polling
     const connect = () => {
-      const ws = new WebSocket(WS_URL)
+      const sep = WS_URL.includes('?') ? '&' : '?'
+      const ws = new WebSocket(`${WS_URL}${sep}topics=cocina&delta=1&since=${lastSeqRef.current}&epoch=${encodeURIComponent(epochRef.current)}`)
       wsRef.current = ws
       ws.onopen = () => {
         setWsConnected(true)
@@ -133,43 +174,77 @@ export default function AdminPage() {
         if (keepAliveTimerRef.current) { clearInterval(keepAliveTimerRef.current); keepAliveTimerRef.current = null }
         keepAliveTimerRef.current = window.setInterval(() => { try { ws.send('ping') } catch {} }, 25000)
       }
+      const handleEvent = (msg: any) => {
+        if (msg.type === 'snapshot') {
+          epochRef.current = msg.epoch
+          setOrders(sortOrders(msg.orders as OrderOut[]))
+        } else if (msg.type === 'new_order') {
+          const order: OrderOut = msg.order
+          pushToast(`Mesa ${order.mesa_numero} · #${order.id}`)
+          setOrders(prev => {
+            const idx = prev.findIndex(o => o.id === order.id)
+            if (idx >= 0) { const copy = [...prev]; copy[idx] = order; return sortOrders(copy) }
+            if (soundRef.current) beep()
+            return sortOrders([...prev, order])
+          })
+        } else if (msg.type === 'update_status') {
+          const { id, estado, version } = msg.order
+          setOrders(prev => prev.map(o => o.id === id ? { ...o, estado, version: version ?? o.version } : o))
+        } else if (msg.type === 'order_delta') {
+          const delta: OrderDelta = msg
+          setOrders(prev => {
+            const idx = prev.findIndex(o => o.id === delta.id)
+            const local = idx < 0 ? undefined : prev[idx].version
+            // delta ya aplicado (p. ej. por la respuesta HTTP de este mismo panel): nada que hacer
+            if (local !== undefined && delta.version <= local) return prev
+            if (local === undefined || delta.base > local) {
+              // hueco de versiones (o orden desconocida): pedir la orden completa
+              try { ws.send(JSON.stringify({ op: 'full', id: delta.id })) } catch {}
+              return prev
+            }
+            const prevOrder = prev[idx]
+            const order = applyDelta(prevOrder, delta)
+            const prevMissing = prevOrder.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
+            const newMissing = order.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
+            if (newMissing > prevMissing && soundRef.current) beep()
+            const copy = [...prev]; copy[idx] = order
+            return sortOrders(copy)
+          })
+        } else if (msg.type === 'order_full') {
+          const order: OrderOut | null = msg.order
+          setOrders(prev => {
+            const rest = prev.filter(o => o.id !== msg.id)
+            return order ? sortOrders([...rest, order]) : rest
+          })
+        } else if (msg.type === 'update_order') {
+          const order: OrderOut = msg.order
+          setOrders(prev => {
+            const idx = prev.findIndex(o => o.id === order.id)
+            if (idx >= 0) {
+              const prevOrder = prev[idx]
+              const prevMissing = prevOrder.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
+              const newMissing = order.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
+              const copy = [...prev]; copy[idx] = order
+              if (newMissing > prevMissing && soundRef.current) beep()
+              return sortOrders(copy)
+            }
+            if (soundRef.current) beep()
+            return sortOrders([...prev, order])
+          })
+        } else if (msg.type === 'order_paid') {
+          const id: number = msg.orden_id
+          setOrders(prev => prev.filter(o => o.id !== id))
+        } else if (msg.type === 'order_cancelled') {
+          const id: number = msg.orden_id
+          setOrders(prev => prev.filter(o => o.id !== id))
+        }
+      }
       ws.onmessage = (evt) => {
         try {
           const msg = JSON.parse(evt.data)
-          if (msg.type === 'new_order') {
-            const order: OrderOut = msg.order
-            pushToast(`Mesa ${order.mesa_numero} · #${order.id}`)
-            setOrders(prev => {
-              const idx = prev.findIndex(o => o.id === order.id)
-              if (idx >= 0) { const copy = [...prev]; copy[idx] = order; return sortOrders(copy) }
-              if (soundRef.current) beep()
-              return sortOrders([...prev, order])
-            })
-          } else if (msg.type === 'update_status') {
-            const { id, estado } = msg.order
-            setOrders(prev => prev.map(o => o.id === id ? { ...o, estado } : o))
-          } else if (msg.type === 'update_order') {
-            const order: OrderOut = msg.order
-            setOrders(prev => {
-              const idx = prev.findIndex(o => o.id === order.id)
-              if (idx >= 0) {
-                const prevOrder = prev[idx]
-                const prevMissing = prevOrder.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
-                const newMissing = order.items.reduce((a, it) => a + Math.max(0, (it.cantidad ?? 0) - (it.entregados ?? 0)), 0)
-                const copy = [...prev]; copy[idx] = order
-                if (newMissing > prevMissing && soundRef.current) beep()
-                return sortOrders(copy)
-              }
-              if (soundRef.current) beep()
-              return sortOrders([...prev, order])
-            })
-          } else if (msg.type === 'order_paid') {
-            const id: number = msg.orden_id
-            setOrders(prev => prev.filter(o => o.id !== id))
-          } else if (msg.type === 'order_cancelled') {
-            const id: number = msg.orden_id
-            setOrders(prev => prev.filter(o => o.id !== id))
-          }
+          if (typeof msg.seq === 'number') lastSeqRef.current = msg.seq
+          if (msg.type === 'batch') (msg.events as any[]).forEach(handleEvent)
+          else handleEvent(msg)
         } catch (e) {
           console.error('WS parse error', e)
         }
@@ -181,11 +256,11 @@ export default function AdminPage() {
         if (reconnectTimerRef.current) clearTimeout(reconnectTimerRef.current)
         // desactivar keep-alive mientras reconecta
         if (keepAliveTimerRef.current) { clearInterval(keepAliveTimerRef.current); keepAliveTimerRef.current = null }
-        // activar polling ligero mientras reconecta
-        if (!pollTimerRef.current) {
-          pollTimerRef.current = window.setInterval(() => {
-            fetch(`${API_PREFIX}/ordenes`).then(r => r.json()).then((list: OrderOut[]) => setOrders(list)).catch(() => {})
-          }, 5000)
+        // sin snapshot todavía: cargar el tablero por HTTP una vez
+        if (!epochRef.current && reconnectAttemptsRef.current === 1) loadOrders()
+        // polling solo si el WS sigue caído tras varios intentos; al reconectar se repiten los eventos perdidos
+        if (!pollTimerRef.current && reconnectAttemptsRef.current >= 3) {
+          pollTimerRef.current = window.setInterval(loadOrders, 15000)
         }
         reconnectTimerRef.current = window.setTimeout(() => connect(), delay)
       }
@@ -343,12 +418,36 @@ export default function AdminPage() {
         // Notificación simple
         try { console.log('Orden lista para cobrar') } catch {}
       }
-      setOrders(prev => prev.map(o => o.id === updated.id ? updated : o))
+      // La versión sólo la avanzan los order_delta: tomarla de la respuesta haría que el delta de este mismo cambio
+      // (base = versión anterior) pareciera un hueco y pidiera la orden completa
+      setOrders(prev => prev.map(o => o.id === updated.id ? { ...o, ...updated, version: o.version } : o))
     } catch (e: any) {
       alert('No se pudo actualizar entregados: ' + e.message)
     }
   }
 
+  // Entrega en lote: todas las líneas pendientes de varias órdenes en una sola petición
+  const entregarOrdenes = async (targets: OrderOut[]) => {
+    if (targets.length === 0) return
+    try {
+      const items = targets.flatMap(o => o.items
+        .filter(it => it.entregados < it.cantidad)
+        .map(it => ({ orden_id: o.id, producto_id: it.producto_id, entregados: it.cantidad })))
+      const resp = await fetch(`${API_PREFIX}/ordenes/lote`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ items })
+      })
+      if (!resp.ok) throw new Error(await resp.text())
+      const updated = await resp.json() as OrderOut[]
+      const byId = new Map(updated.map(o => [o.id, o]))
+      setOrders(prev => prev.map(o => byId.has(o.id) ? { ...o, ...byId.get(o.id)!, version: o.version } : o))
+      if (soundRef.current) beep()
+    } catch (e: any) {
+      alert('No se pudieron entregar las órdenes: ' + e.message)
+    }
+  }
+
   // Gestión de productos
   const handleProdChange = (index: number, field: keyof ProductoOut, value: string) => {
     setProductos(prev => prev.map((p, i) => {
@@ -764,6 +863,14 @@ export default function AdminPage() {
                 <span className={`ml-1 px-2 py-0.5 text-xs rounded-full ${cocinaCriticalOnly ? 'bg-white/20 text-white' : 'bg-red-100 text-red-800'}`}>{criticalCount}</span>
               </button>
               <span className="px-2 py-0.5 text-xs rounded bg-blue-100 text-blue-800">Faltan {totalFaltantesCocina}</span>
+              {criticalCount > 0 && (
+                <button className="px-2 py-0.5 text-xs rounded bg-green-600 text-white" onClick={() => {
+                  const criticos = kitchenOrders.filter(o => Math.floor((nowTs - new Date(o.fecha).getTime()) / 60000) >= 7)
+                  if (confirm(`Entregar todo en ${criticos.length} órdenes críticas?`)) entregarOrdenes(criticos)
+                }}>
+                  Entregar críticos
+                </button>
+              )}
             </div>
           </div>
           <div className="sticky top-10 sm:top-14 z-10 bg-white/90 backdrop-blur p-2 md:p-3 rounded flex flex-wrap md:flex-nowrap gap-2 text-xs overflow-x-auto md:overflow-visible no-scrollbar scroll-smooth">
@@ -799,6 +906,11 @@ export default function AdminPage() {
                 <div className="text-xs text-gray-600 flex items-center flex-wrap gap-2 justify-between">
                   <span className={`px-2 py-0.5 text-xs rounded ${ageCls}`}>{ageLabel}</span>
                   <span className={`px-2 py-0.5 text-xs rounded ${faltantesOrden(order) > 0 ? 'bg-blue-100 text-blue-800' : 'bg-green-100 text-green-800'}`}>{faltantesOrden(order) > 0 ? `Faltan ${faltantesOrden(order)}` : 'Listo'}</span>
+                  {faltantesOrden(order) > 0 && (
+                    <button className="ml-2 px-2 py-0.5 text-xs rounded bg-green-100 text-green-800 hover:bg-green-200" onClick={() => { if (confirm(`Entregar todo en la orden #${order.id}?`)) entregarOrdenes([order]) }}>
+                      Entregar todo
+                    </button>
+                  )}
                   {faltantesOrden(order) === 0 && (
                     <button className="ml-2 px-2 py-0.5 text-xs rounded bg-green-600 text-white" onClick={() => { if (confirm(`Marcar orden #${order.id} como lista/entregada?`)) updateEstado(order.id, 'entregado') }}>
                       Listo
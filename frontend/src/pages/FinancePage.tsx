@@ -1,11 +1,50 @@
 import { useEffect, useMemo, useState } from 'react'
 
 const API_PREFIX = (import.meta.env.VITE_API_BASE as string) || '/api'
+const PAGE_SIZE = 100
+
+type GrupoOut = {
+  dia?: string | null
+  hora?: number | null
+  dia_semana?: number | null
+  metodo?: string | null
+  total: number
+  propina: number
+  cantidad: number
+}
 
 type ResumenOut = {
   total: number
   propina: number
   cantidad: number
+  grupos?: GrupoOut[] | null
+}
+
+const AGRUPACIONES: Record<string, string> = {
+  '': 'Sin desglose',
+  dia: 'Por día',
+  hora: 'Por hora',
+  dia_semana: 'Por día de la semana',
+  metodo: 'Por método',
+}
+const DIAS_SEMANA = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
+
+const etiquetaGrupo = (g: GrupoOut) => {
+  if (g.dia != null) return g.dia
+  if (g.hora != null) return `${String(g.hora).padStart(2, '0')}:00`
+  if (g.dia_semana != null) return DIAS_SEMANA[g.dia_semana] ?? String(g.dia_semana)
+  return g.metodo ?? ''
+}
+
+type AnaliticaOut = {
+  // Inicio efectivo del rango: sin "Desde" el servidor usa los últimos ANALYTICS_DIAS días
+  desde: string
+  pagos: number
+  lineas: number
+  total: number
+  por_hora: { hora: number; total: number; pagos: number; top: { producto_id: number; nombre: string; cantidad: number; total: number }[] }[]
+  por_mesa: { mesa_numero: number; total: number; pagos: number; ticket_promedio: number }[]
+  por_dia_semana: { dia_semana: number; total: number; pagos: number; ticket_promedio: number }[]
 }
 
 type PagoOut = {
@@ -21,9 +60,14 @@ export default function FinancePage() {
   const [loading, setLoading] = useState(true)
   const [authChecked, setAuthChecked] = useState(false)
   const [resumen, setResumen] = useState<ResumenOut | null>(null)
+  const [analitica, setAnalitica] = useState<AnaliticaOut | null>(null)
   const [pagos, setPagos] = useState<PagoOut[]>([])
+  // Cursor de la página siguiente de pagos (X-Next-Cursor); null si no hay más
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [desde, setDesde] = useState<string>('')
   const [hasta, setHasta] = useState<string>('')
+  const [agrupar, setAgrupar] = useState<string>('')
   const [error, setError] = useState<string | null>(null)
 
   const qs = useMemo(() => {
@@ -34,6 +78,13 @@ export default function FinancePage() {
     return q ? `?${q}` : ''
   }, [desde, hasta])
 
+  const pagosUrl = (cursor: string | null) => {
+    const p = new URLSearchParams(qs.slice(1))
+    p.set('limit', String(PAGE_SIZE))
+    if (cursor) p.set('cursor', cursor)
+    return `${API_PREFIX}/finanzas/pagos?${p.toString()}`
+  }
+
   const checkAuth = async () => {
     try {
       const resp = await fetch(`${API_PREFIX}/finanzas/me`, { credentials: 'include' })
@@ -49,13 +100,25 @@ export default function FinancePage() {
     }
   }
 
+  // La analítica es la consulta más pesada: se carga aparte para no retrasar resumen y pagos
+  const loadAnalitica = async () => {
+    try {
+      const resp = await fetch(`${API_PREFIX}/finanzas/analitica${qs}`, { credentials: 'include' })
+      if (!resp.ok) throw new Error(await resp.text())
+      setAnalitica(await resp.json())
+    } catch (e: any) {
+      setError(e.message || 'Error al cargar la analítica')
+    }
+  }
+
   const loadData = async () => {
     setLoading(true)
     setError(null)
+    loadAnalitica()
     try {
       const [r1, r2] = await Promise.all([
-        fetch(`${API_PREFIX}/finanzas/resumen${qs}`, { credentials: 'include' }),
-        fetch(`${API_PREFIX}/finanzas/pagos${qs}`, { credentials: 'include' }),
+        fetch(`${API_PREFIX}/finanzas/resumen${qs}${agrupar ? `${qs ? '&' : '?'}agrupar=${agrupar}` : ''}`, { credentials: 'include' }),
+        fetch(pagosUrl(null), { credentials: 'include' }),
       ])
       if (!r1.ok) throw new Error(await r1.text())
       if (!r2.ok) throw new Error(await r2.text())
@@ -63,6 +126,7 @@ export default function FinancePage() {
       const pagosData: PagoOut[] = await r2.json()
       setResumen(resumenData)
       setPagos(pagosData)
+      setNextCursor(r2.headers.get('X-Next-Cursor'))
     } catch (e: any) {
       setError(e.message || 'Error al cargar datos')
     } finally {
@@ -70,6 +134,22 @@ export default function FinancePage() {
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const resp = await fetch(pagosUrl(nextCursor), { credentials: 'include' })
+      if (!resp.ok) throw new Error(await resp.text())
+      const more: PagoOut[] = await resp.json()
+      setPagos(prev => [...prev, ...more])
+      setNextCursor(resp.headers.get('X-Next-Cursor'))
+    } catch (e: any) {
+      setError(e.message || 'Error al cargar más pagos')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     checkAuth()
   }, [])
@@ -78,7 +158,7 @@ export default function FinancePage() {
     if (authChecked) {
       loadData()
     }
-  }, [authChecked, qs])
+  }, [authChecked, qs, agrupar])
 
   const logout = async () => {
     try {
@@ -93,6 +173,9 @@ export default function FinancePage() {
         <h1 className="font-semibold">Finanzas</h1>
         <div className="flex items-center gap-2">
           <button onClick={loadData} className="px-2 py-1 text-sm rounded bg-blue-100 text-blue-800 hover:bg-blue-200">Refrescar</button>
+          {/* Exportes completos del rango, descargados por streaming desde el servidor */}
+          <a href={`${API_PREFIX}/finanzas/export${qs}${qs ? '&' : '?'}formato=csv&lineas=true`} className="px-2 py-1 text-sm rounded bg-green-100 text-green-800 hover:bg-green-200">Exportar CSV</a>
+          <a href={`${API_PREFIX}/finanzas/export${qs}${qs ? '&' : '?'}formato=ndjson&lineas=true`} className="px-2 py-1 text-sm rounded bg-green-100 text-green-800 hover:bg-green-200">NDJSON</a>
           <button onClick={logout} className="px-2 py-1 text-sm rounded bg-gray-200 hover:bg-gray-300">Salir</button>
         </div>
       </div>
@@ -112,6 +195,12 @@ export default function FinancePage() {
                 <label className="block text-xs text-gray-600">Hasta</label>
                 <input type="date" className="border rounded px-2 py-1" value={hasta} onChange={e => setHasta(e.target.value)} />
               </div>
+              <div>
+                <label className="block text-xs text-gray-600">Desglose</label>
+                <select className="border rounded px-2 py-1" value={agrupar} onChange={e => setAgrupar(e.target.value)}>
+                  {Object.entries(AGRUPACIONES).map(([value, label]) => <option key={value} value={value}>{label}</option>)}
+                </select>
+              </div>
             </div>
           </div>
 
@@ -125,6 +214,89 @@ export default function FinancePage() {
           </div>
         </div>
 
+        {resumen?.grupos && (
+          <div className="bg-white rounded shadow p-3">
+            <div className="font-medium mb-2">{AGRUPACIONES[agrupar]}</div>
+            <div className="overflow-x-auto">
+              <table className="min-w-full text-sm">
+                <thead>
+                  <tr className="text-left">
+                    <th className="px-2 py-1">Grupo</th>
+                    <th className="px-2 py-1">Pagos</th>
+                    <th className="px-2 py-1">Total</th>
+                    <th className="px-2 py-1">Propina</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {resumen.grupos.length === 0 ? (
+                    <tr><td className="px-2 py-3" colSpan={4}>Sin pagos en el rango</td></tr>
+                  ) : resumen.grupos.map(g => (
+                    <tr key={etiquetaGrupo(g)} className="border-t">
+                      <td className="px-2 py-1">{etiquetaGrupo(g)}</td>
+                      <td className="px-2 py-1">{g.cantidad}</td>
+                      <td className="px-2 py-1">${g.total.toFixed(2)}</td>
+                      <td className="px-2 py-1">${g.propina.toFixed(2)}</td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          </div>
+        )}
+
+        {analitica && analitica.pagos > 0 && (
+          <div className="grid grid-cols-1 md:grid-cols-2 gap-3">
+            <div className="bg-white rounded shadow p-3">
+              <div className="font-medium mb-2">Top productos por hora{desde ? '' : ` (desde ${analitica.desde})`}</div>
+              <div className="overflow-x-auto">
+                <table className="min-w-full text-sm">
+                  <thead>
+                    <tr className="text-left">
+                      <th className="px-2 py-1">Hora</th>
+                      <th className="px-2 py-1">Total</th>
+                      <th className="px-2 py-1">Productos</th>
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {analitica.por_hora.map(h => (
+                      <tr key={h.hora} className="border-t align-top">
+                        <td className="px-2 py-1">{`${String(h.hora).padStart(2, '0')}:00`}</td>
+                        <td className="px-2 py-1">${h.total.toFixed(2)}</td>
+                        <td className="px-2 py-1">{h.top.map(t => `${t.nombre} ×${t.cantidad}`).join(', ')}</td>
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            </div>
+            <div className="bg-white rounded shadow p-3">
+              <div className="font-medium mb-2">Ventas por mesa</div>
+              <div className="overflow-x-auto">
+                <table className="min-w-full text-sm">
+                  <thead>
+                    <tr className="text-left">
+                      <th className="px-2 py-1">Mesa</th>
+                      <th className="px-2 py-1">Pagos</th>
+                      <th className="px-2 py-1">Total</th>
+                      <th className="px-2 py-1">Ticket promedio</th>
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {analitica.por_mesa.map(m => (
+                      <tr key={m.mesa_numero} className="border-t">
+                        <td className="px-2 py-1">{m.mesa_numero}</td>
+                        <td className="px-2 py-1">{m.pagos}</td>
+                        <td className="px-2 py-1">${m.total.toFixed(2)}</td>
+                        <td className="px-2 py-1">${m.ticket_promedio.toFixed(2)}</td>
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            </div>
+          </div>
+        )}
+
         <div className="bg-white rounded shadow p-3">
           <div className="flex items-center justify-between mb-2">
             <div className="font-medium">Pagos ({resumen ? resumen.cantidad : 0})</div>
@@ -159,6 +331,13 @@ export default function FinancePage() {
               </tbody>
             </table>
           </div>
+          {!loading && nextCursor && (
+            <div className="mt-2 flex justify-center">
+              <button onClick={loadMore} disabled={loadingMore} className="px-3 py-1 text-sm rounded bg-gray-100 hover:bg-gray-200 disabled:opacity-50">
+                {loadingMore ? 'Cargando...' : `Cargar más (${pagos.length} de ${resumen ? resumen.cantidad : '?'})`}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>